@@ -4,12 +4,17 @@ setup(
     name='stonks',
     version='1.0.0',
     packages=find_packages(),
+    python_requires='>=3.10',
     install_requires=[
       'yfinance',
       'pandas',
       'tabulate',
       'currency_converter',
+      'numpy',
     ],
+    extras_require={
+      'arrow': ['pyarrow'],
+    },
 	entry_points={
         'console_scripts': [
             'stonks = stonks.__main__:main',
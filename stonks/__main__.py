@@ -1,16 +1,23 @@
 #!/usr/bin/env python3
-import yfinance as yf
 import sys
-import csv
-import json
-from tabulate import tabulate
-import pandas as pd
 import argparse
-import time
+import functools
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 import stonks.numbers as num
-import stonks.finance as fin
-import stonks.formatting as fmt
 import stonks.info as info
+import stonks.lazy as lazy
+import stonks.metrics as metrics
+import stonks.output as out
+import stonks.ranking as ranking
+import stonks.scoring as scoring
+import stonks.screen as screen
+import stonks.shard as shard
+import stonks.sources as sources
+import stonks.throttle as throttle
+import stonks.timing as timing
+from stonks.cache import Cache
+from stonks.journal import Journal
 
 def make_table(ticker, use_color, data):
     """
@@ -19,143 +26,117 @@ def make_table(ticker, use_color, data):
     Parameters:
     - ticker (str): Stock ticker symbol.
     - use_color (bool): Flag to enable or disable color formatting.
-    - info: Information about the stock.
-    - balance: Balance sheet data.
-    - income: Income statement data.
-    - cashflow: Cashflow data.
+    - data: FinancialData.data for the ticker.
 
     Returns:
     dict: A dictionary representing the financial metrics table.
     """
+    return metrics.render(metrics.collect(ticker, data), use_color)
 
-    _currency = data['info'].get('financialCurrency', None)
-    _exchange_rate = num.get_rate(_currency)
+def clean_ticker(ticker):
+    # Yahoo uses '-' for share classes (e.g. BRK-B) where others use '/' or '.'
+    return ticker.replace('/', '-').replace('.', '-')
 
-    _raw_cap = data['info'].get('marketCap', None)
-    _mkt_cap = num.format_currency(_raw_cap)
-
-    _current_price = num.format_currency(data['info'].get('currentPrice', None))
-
-    _total_debt = fin.current_debt(data)
-    _total_debt = num.exchange_currency(_total_debt, _exchange_rate)
-    _total_debt = num.format_currency(_total_debt)
-
-    _current_cash = fin.current_cash(data)
-    _current_cash = num.exchange_currency(_current_cash, _exchange_rate)
-    _current_cash = num.format_currency(_current_cash)
-
-    _debt_to_equity = fin.debt_to_equity(data)
-    _debt_to_equity = fmt.colorize(_debt_to_equity, "low", 0.5, 1, use_color)
-
-    _debt_to_earnings = fin.debt_to_earnings(data)
-    _debt_to_earnings = fmt.colorize(_debt_to_earnings, "low", 1, 2, use_color)
-
-    _earnings_yield = fin.earnings_yield(data)
-    _earnings_yield = fmt.colorize(_earnings_yield, "high", 1, 2, use_color)
-
-    _current_ratio = fin.current_ratio(data)
-    _current_ratio = fmt.colorize(_current_ratio, "high", 1, 1, use_color)
-
-    _quick_ratio = fin.quick_ratio(data)
-    _quick_ratio = fmt.colorize(_quick_ratio, "high", 1, 1, use_color)
-
-    _avg_revenue_growth = fin.revenue_growth(data)
-    _avg_revenue_growth = fmt.colorize(_avg_revenue_growth, "high", 8, 12, use_color)
-
-    _profit_margin = fin.profit_margin(data)
-    _profit_margin = fmt.colorize(_profit_margin, "high", 10, 15, use_color)
-
-    _roe = fin.return_on_equity(data)
-    _roe = fmt.colorize(_roe, "high", 10, 15, use_color)
-
-    _eps = data['info'].get('trailingEps', None)
-    _eps = fmt.colorize(_eps, "high", 3, 8, use_color)
-
-    _pe = round(float(data['info'].get('trailingPE', 'NaN')), 2)
-
-    _avg_fcf_change = fin.avg_free_cash_flow_change(data)
-    _avg_fcf_change = fmt.colorize(_avg_fcf_change, "high", 5, 10, use_color)
-
-    _raw_fcf = fin.avg_free_cash_flow(data)
-    _raw_fcf = num.exchange_currency(_raw_fcf, _exchange_rate)
-
-    _avg_fcf = num.format_currency(_raw_fcf)
-    _avg_fcf = fmt.colorize(_avg_fcf, "high", 0, 1, use_color)
-
-    _fcf_yield = fin.fcf_yield(_raw_cap, _raw_fcf)
-    _fcf_yield = fmt.colorize(_fcf_yield, "high", 0, 5, use_color)
-
-    # Build table with desired data
-    table = {
-        "Ticker": ticker.upper(),
-        "Currency": _currency,
-        "Market Cap": _mkt_cap,
-        "Current Price": _current_price,
-        "Cash on hand": _current_cash,
-        "Current Debt": _total_debt,
-        "Debt to Equity": _debt_to_equity,
-        "Debt to Earnings": _debt_to_earnings,
-        "Earnings Yield": _earnings_yield,
-        "Current Ratio": _current_ratio,
-        "Quick Ratio": _quick_ratio,
-        "Avg Revenue Growth": _avg_revenue_growth,
-        "Profit Margin": _profit_margin,
-        "Return on Equity": _roe,
-        "EPS": _eps,
-        "PE": _pe,
-        "Avg Cashflow": _avg_fcf,
-        "Avg Cashflow Growth": _avg_fcf_change,
-        "Cashflow Yield": _fcf_yield,
-    }
-
-    # We need a table with no colors in order to calculate the score
-    clean_table = fmt.remove_colors_from_table(table)
-    _score = fin.calc_score(clean_table)
-    _score = fmt.colorize(_score, "high", 20, 28, use_color)
-    # Add score to orginal table
-    table["Score"] = _score
-
-    return table
-
-def process_ticker(ticker, use_color, output, csv_writer, print_info, quarterly):
+def process_ticker(ticker, print_info, quarterly, limiter=None, retries=0, cache=None, profile=None, quotes=None, source=None, names=None, where=None):
     """
-    Process a single stock ticker and output financial metrics.
+    Fetch and process a single stock ticker.  This is safe to run on a worker
+    thread since it does not write anything to stdout.
 
     Parameters:
     - ticker (str): Stock ticker symbol.
-    - use_color (bool): Flag to enable or disable color formatting.
-    - output_csv (bool): Flag to determine the output format (CSV or table).
-    - csv_writer: CSV writer object for writing to stdout.
-    """
-    try:
-        ticker = ticker.replace('/', '-').replace('.', '-')
-        data_class = info.FinancialData(ticker)
-        data = data_class.data
+    - print_info (str): Type of --info data to return instead of the metrics table.
+    - quarterly (bool): Return quarterly --info data instead of annual.
+    - limiter (RateLimiter): Rate limiter shared by all requests to Yahoo.
+    - retries (int): Number of retries for throttled or failed requests.
+    - cache (Cache): On-disk dataset cache or None to always fetch.
+    - profile (dict): Scoring profile, defaults to scoring.DEFAULT_PROFILE.
+    - quotes (dict): Fresh price fields by ticker from info.fetch_quotes().
+    - source: Where to fetch the datasets from, defaults to Yahoo.
+    - names (list): Only work out these fields (see --fields), defaults to all.
+    - where (screen.Where): Only return the metrics if they match this.
 
-        if print_info is not None:
-            pdata = info.print_data(data, print_info, quarterly)
-            print(pdata)
-        else:
-            # We don't want color formatting data mucking up csv output
-            if output is not None:
-                use_color = False
-
-            table = make_table(ticker, use_color, data)
-
-            # Output data in either csv or table format depending on what is requested
-            if output == 'csv':
-                csv_writer.writerow([str(value) for value in table.values()])
-            elif output == 'json':
-                json_string = json.dumps(table, indent=2)
-                print(json_string)        
+    Returns:
+    tuple: The result (InfoResult or TickerMetrics) and an error message, at
+    least one of which is None (both when --where filtered the ticker out),
+    and the number of requests that had to be retried.
+    """
+    ticker = clean_ticker(ticker)
+    quote = quotes.get(ticker.upper()) if quotes else None
+    data_class = info.FinancialData(ticker, limiter, retries, cache, source, quote)
+
+    # Anything going wrong with one ticker (including a network blip that
+    # outlasted the retries) shouldn't take the rest of the run down with it.
+    with timing.ticker(ticker.upper()):
+        try:
+            data = data_class.data
+
+            # --record saves every dataset, not only the ones this run needs,
+            # so the fixtures can be replayed with any --fields or --info.
+            if isinstance(source, sources.RecordingSource):
+                for name in info.DATASETS:
+                    data[name]
+
+            if print_info is not None:
+                return info.InfoResult(ticker, print_info, info.get_data(data, print_info, quarterly)), None, data_class.retried
+
+            # Clauses of --where that only need 'info' are checked before any
+            # of the statements are fetched.
+            if where is not None:
+                early = where.split(screen.info_only)[0]
+                if early and not early(metrics.collect(ticker, data, profile, early.fields())):
+                    return None, None, data_class.retried
+
+            # With a cache, metrics are only worked out again when a statement,
+            # the price or the profile changed since the last run.
+            if cache is not None:
+                result = metrics.collect_cached(ticker, data, cache, profile, names)
             else:
-                table_as_list = [[key, value] for key, value in table.items()]
-                print(tabulate(table_as_list, headers=["Attribute", "Value"], tablefmt="simple"))
+                result = metrics.collect(ticker, data, profile, names)
+
+            if where is not None and not where(result):
+                return None, None, data_class.retried
+
+            return result, None, data_class.retried
+
+        except Exception as e:
+            return None, f"Error: {e}", data_class.retried
+
+def run_tickers(tickers, worker, workers):
+    # Run worker() for each ticker and yield the results in ticker order.  With
+    # more than one worker the tickers are fetched on a thread pool, map() hands
+    # the results back in the original ticker order so the output is the same
+    # either way.
+    if workers > 1:
+        # Import these before the threads are started rather than in whichever
+        # thread needs them first.
+        lazy.load('numpy', 'pandas')
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(worker, tickers)
+    else:
+        for ticker in tickers:
+            yield worker(ticker)
+
+def print_failures(failures):
+    # Report the tickers that failed on stderr once the run is done.
+    if not failures:
+        return
+
+    print(f"{len(failures)} ticker(s) failed:", file=sys.stderr)
+    for entry in failures:
+        print(f"  {entry['ticker']} (retries: {entry['retries']}): {entry['error']}", file=sys.stderr)
+
+# Sub commands, run as `stonks <command> ...`, and the module whose main()
+# runs them.  Anything else on the command line is a ticker.
+COMMANDS = {
+    'serve': 'stonks.serve',
+    'watch': 'stonks.watch',
+    'merge': 'stonks.merge',
+}
 
-    except (ValueError, TypeError) as e:
-        return f"{ticker} Error: {e}"
-        
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        return importlib.import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:])
+
     # Parse arguments
     parser = argparse.ArgumentParser(description='Stonks - A financial analysis tool for stock tickers, providing key metrics and scores for informed investment decisions.')
     parser.add_argument('tickers', nargs='*', type=str, help='Stock ticker symbols')
@@ -164,8 +145,37 @@ def main():
     parser.add_argument('--csv', action='store_true', help='Output in CSV format') 
     parser.add_argument('-H', '--header', action='store_true', help='Include header in CSV output')
     parser.add_argument('--json', action='store_true', help='Output in json format')
+    parser.add_argument('--jsonl', action='store_true', help='Output one compact json object per line')
+    parser.add_argument('--parquet', type=str, metavar='PATH', help='Write typed columns to a Parquet file (requires pyarrow)')
+    parser.add_argument('--arrow', type=str, metavar='PATH', help='Write typed columns to an Arrow IPC file (requires pyarrow)')
     parser.add_argument('--info', choices=['info', 'balance', 'income', 'cashflow', 'financials'], help='Specify the type of financial information to retrieve')
     parser.add_argument('-q', '--quarterly', action='store_true', help='When used with --info this will return quarterly results instead of annual')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of tickers to fetch concurrently (default: 1)')
+    parser.add_argument('--processes', type=int, default=1, help='Number of processes to spread the tickers over, each fetching --workers at once and sharing --rate (default: 1)')
+    parser.add_argument('--shard', type=str, metavar='I/N', help="Only run shard I (from 0) of N of the tickers, put the outputs back together with 'stonks merge'")
+    parser.add_argument('--rate', type=float, default=5, help='Maximum requests per second to Yahoo, 0 for unlimited (default: 5)')
+    parser.add_argument('--retries', type=int, default=3, help='Retries with exponential backoff for throttled (429) or failed (5xx) requests (default: 3)')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Directory for the on-disk data cache (default: ~/.cache/stonks)')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached data and fetch everything again')
+    parser.add_argument('--offline', action='store_true', help='Only use cached data, never go to the network')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the on-disk data cache')
+    parser.add_argument('--source', type=str, default='yahoo', help="Where to get data from: 'yahoo' or 'fixtures:DIR' to replay datasets recorded with --record (default: yahoo)")
+    parser.add_argument('--record', type=str, metavar='DIR', help='Record every dataset of every ticker to DIR so the run can be replayed with --source fixtures:DIR')
+    parser.add_argument('--quotes', action='store_true', help='Refresh prices for all tickers with bulk quote requests and reuse cached fundamentals up to a day old')
+    parser.add_argument('--fields', type=str, help="Comma separated fields to output, e.g. 'fcf_yield,score' or 'Cashflow Yield,Score'; only the data they need is fetched (default: all)")
+    parser.add_argument('--where', type=str, help="Only output tickers matching an expression, e.g. 'fcf_yield > 5 and score > 25'")
+    parser.add_argument('--top', type=int, metavar='K', help='Only output the best K tickers by --sort-by (default field: score)')
+    parser.add_argument('--sort-by', type=str, metavar='FIELD', help='Output the tickers sorted by a field, highest first')
+    parser.add_argument('--ascending', action='store_true', help='With --top or --sort-by, lowest first')
+    parser.add_argument('--rank', type=str, metavar='FIELDS', help="Add percentile and z-score columns ranking these comma separated fields across the tickers in the run")
+    parser.add_argument('--rank-by', choices=ranking.GROUPS, help='With --rank, rank tickers against the others in the same sector or industry')
+    parser.add_argument('--score-profile', type=str, default='default', help='Scoring profile (TOML or JSON file) to score with (default: built in profile)')
+    parser.add_argument('--checkpoint', type=str, metavar='FILE', help='Record every finished ticker and its result in a checkpoint journal')
+    parser.add_argument('--resume', action='store_true', help='Skip tickers the --checkpoint journal already has results for (their results are written again)')
+    parser.add_argument('--profile', action='store_true', help='Time every stage of every ticker and print a report on stderr at the end')
+    parser.add_argument('--metrics-out', type=str, metavar='FILE', help='Write the per ticker stage timings to a JSON file')
+    parser.add_argument('--pstats', type=str, metavar='FILE', help='Run cProfile on every ticker and dump the merged stats to FILE')
+    parser.add_argument('--rates-file', type=str, help='JSON snapshot of exchange rates to USD, rates in the file are pinned and any new ones are added to it')
 
     args = parser.parse_args()
 
@@ -175,12 +185,33 @@ def main():
     use_header = args.header
     print_info = args.info
     quarterly = args.quarterly
+    workers = max(1, args.workers)
+    processes = max(1, args.processes)
+
+    try:
+        source = sources.make_source(args.source)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Replayed data is already on disk so it isn't cached or rate limited.
+    # Recording fetches everything fresh so every dataset makes it into the
+    # fixtures, not just the ones that weren't cached.
+    replay = isinstance(source, sources.FixtureSource)
+    limiter = throttle.RateLimiter(0 if replay else args.rate)
+    cache = None if args.no_cache or replay else Cache(args.cache_dir, args.refresh or bool(args.record), args.offline)
+
+    if args.record:
+        source = sources.RecordingSource(source, args.record)
+
     tickers = []
 
     if output_csv:
         output = 'csv'
     elif output_json:
         output = 'json'
+    elif args.jsonl:
+        output = 'jsonl'
     else:
         output = None
 
@@ -196,21 +227,198 @@ def main():
         print("Error: No ticker symbols provided.")
         sys.exit(1)
 
-    # define csv_writer
-    csv_writer = csv.writer(sys.stdout)
+    if args.rates_file:
+        num.load_rates_file(args.rates_file)
 
-    # I'm not a fan of how this works but if header is to be printed I only want it to be printed once so
-    # this manually creates that header row before the process_ticker() iterations.
-    if output == 'csv' and use_header:
-        csv_writer.writerow(["Ticker", "Currency", "Market Cap", "Current Price", "Cash on hand", "Current Debt", "Debt to Equity", "Debt to Earnings",
-                            "Earnings Yield", "Current Ratio", "Quick Ratio", "Avg Revenue Growth",
-                            "Profit Margin", "Return on Equity", "EPS", "PE", "Avg Cashflow",
-                            "Avg Cashflow Growth", "Cashflow Yield", "Score"])
+    try:
+        profile = scoring.load_profile(args.score_profile)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    try:
+        names = metrics.parse_fields(args.fields) if args.fields else None
+        where = screen.Where.parse(args.where) if args.where else None
+        ranked_names = metrics.parse_fields(args.rank) if args.rank else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if ranked_names is not None and not set(ranked_names) <= set(metrics.NUMERIC):
+        print(f"Error: Can only --rank numbers, expected some of: {', '.join(metrics.NUMERIC)}")
+        sys.exit(1)
+
+    if args.rank_by and ranked_names is None:
+        print("Error: --rank-by needs --rank.")
+        sys.exit(1)
+
+    sort_by = args.sort_by or ('score' if args.top else None)
+    rank_columns = ranking.columns(ranked_names) if ranked_names is not None else []
+    sortable = metrics.NUMERIC + [column[1] for column in rank_columns]
+
+    if sort_by is not None and sort_by not in sortable:
+        print(f"Error: Can't sort by '{sort_by}', expected one of: {', '.join(sortable)}")
+        sys.exit(1)
+
+    if print_info is not None and (where is not None or sort_by is not None or ranked_names is not None):
+        print("Error: --where, --top, --sort-by and --rank only work on the metrics, not --info.")
+        sys.exit(1)
+
+    # Whatever the screen or the ranks look at has to be worked out even if it
+    # isn't output.
+    computed = names
+    if names is not None:
+        screened = set(names) | set(where.fields() if where is not None else []) | {sort_by, args.rank_by}
+        screened |= set(ranked_names or [])
+        computed = [name for name in metrics.FIELDS if name in screened]
+
+    # With --top only the best K results are held on to and they are written
+    # at the end, otherwise results are written as they come in.
+    top = screen.Top(args.top, sort_by, args.ascending) if sort_by is not None else None
+
+    if args.resume and not args.checkpoint:
+        print("Error: --resume needs a --checkpoint journal.")
+        sys.exit(1)
+
+    journal = Journal(args.checkpoint, args.resume) if args.checkpoint else None
+
+    # Results are written and flushed one at a time, the header (if any) is
+    # written right away.
+    try:
+        writer = out.make_writer(output, use_color, use_header, parquet=args.parquet, arrow=args.arrow, names=names, extra=rank_columns)
+    except ImportError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    recorder = timing.enable(args.pstats is not None) if args.profile or args.metrics_out or args.pstats else None
+
+    # With --resume the tickers the journal already has are skipped, their
+    # results come from the journal instead (in the same spot in the output).
+    tickers = [clean_ticker(ticker) for ticker in tickers]
+
+    if args.shard:
+        try:
+            tickers = shard.select(tickers, *shard.parse(args.shard))
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    # What the journal had before this run started.  Tickers it records along
+    # the way (like the first of a ticker given twice) still have to be run.
+    done = {ticker.upper(): journal.completed(ticker.upper()) for ticker in tickers} if journal is not None else {}
+    completed = lambda ticker: done.get(ticker.upper())
+    pending = [ticker for ticker in tickers if completed(ticker) is None]
+
+    # With --quotes the prices for every ticker come from a handful of bulk
+    # requests up front, so 'info' only has to be fetched when the cached copy
+    # is over a day old.  They aren't needed if none of the --fields use 'info'.
+    #
+    # The quotes are also fetched when --where has clauses only about the
+    # price, tickers failing those are dropped before anything else about
+    # them is fetched.
+    quotes = None
+    pruned = set()
+    uses_info = print_info == 'info' or (print_info is None and 'info' in metrics.datasets(computed, profile))
+    use_quotes = args.quotes and uses_info
+    price_screen = where is not None and bool(where.split(screen.quote_only)[0])
+
+    if (use_quotes or price_screen) and not args.offline and hasattr(source, 'quotes'):
+        try:
+            fetched = info.fetch_quotes(pending, source, limiter, args.retries)
+        except Exception as e:
+            print(f"Failed to fetch quotes, using per ticker info instead: {e}", file=sys.stderr)
+        else:
+            quotes = fetched if use_quotes else None
+            if price_screen:
+                pruned = set(pending) - set(screen.prefilter(where, pending, fetched, profile))
+                pending = [ticker for ticker in pending if ticker not in pruned]
+
+    worker = functools.partial(process_ticker, print_info=print_info, quarterly=quarterly,
+                               limiter=limiter, retries=args.retries, cache=cache, profile=profile, quotes=quotes, source=source,
+                               names=computed, where=where)
+
+    # With more than one process the rate limit is split between them, they
+    # all still go out through the same IP.
+    if processes > 1:
+        settings = dict(print_info=print_info, quarterly=quarterly, retries=args.retries, profile=profile, quotes=quotes,
+                        source=source, names=computed, where=args.where, threads=workers,
+                        rate=limiter.rate / processes,
+                        cache=None if cache is None else (cache.path, cache.refresh, cache.offline),
+                        rates=num.get_rates(), timings=None if recorder is None else recorder.profile)
+        results = shard.run_processes(pending, processes, settings)
+    else:
+        results = run_tickers(pending, worker, workers)
+    failures = []
+
+    # Ranks need every ticker in the run so those are held on to until the end.
+    unranked = []
+
+    def emit(result):
+        if ranked_names is not None and isinstance(result, metrics.TickerMetrics):
+            unranked.append(result)
+        elif top is not None and isinstance(result, metrics.TickerMetrics):
+            top.add(result)
+        else:
+            writer.write(result)
 
-    # Run process_ticker() for each ticker in tickers.
     for ticker in tickers:
-        process_ticker(ticker, use_color, output, csv_writer, print_info, quarterly)
-        time.sleep(0.5)
+        entry = completed(ticker)
+
+        if entry is not None:
+            if entry['result'] is not None:
+                record = metrics.from_row(entry['result'])
+                if where is None or where(record):
+                    emit(record)
+            continue
+
+        # Filtered out by its quote, recorded as done without a result.
+        if ticker in pruned:
+            if journal is not None:
+                journal.record(ticker.upper())
+            continue
+
+        result, error, retried = next(results)
+
+        with timing.ticker(ticker.upper()), timing.timed('output'):
+            emit(result)
+
+        if journal is not None:
+            journal.record(ticker.upper(), result, error, retried)
+        if error is not None:
+            failures.append({'ticker': ticker.upper(), 'retries': retried, 'error': error})
+
+    if ranked_names is not None:
+        with timing.timed('rank'):
+            results = ranking.rank_records(unranked, ranked_names, args.rank_by)
+
+        for record in results:
+            if top is not None:
+                top.add(record)
+            else:
+                writer.write(record)
+
+    if top is not None:
+        with timing.timed('output'):
+            for record in top.results():
+                writer.write(record)
+
+    writer.close()
+
+    if journal is not None:
+        journal.close()
+
+    print_failures(failures)
+
+    if recorder is not None:
+        if args.profile:
+            print(recorder.report(), file=sys.stderr)
+        if args.metrics_out:
+            recorder.dump(args.metrics_out)
+        if args.pstats:
+            recorder.dump_stats(args.pstats)
+
+    if args.rates_file:
+        num.save_rates_file(args.rates_file)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import stonks.info as info
+import stonks.lazy as lazy
+import stonks.sources as sources
+import stonks.throttle as throttle
+
+class AsyncFinancialData:
+    # Fetches the datasets for many tickers at once from an asyncio event loop.
+    # At most `concurrency` requests are in flight at a time and they all go
+    # through the one source, so a run over a few hundred tickers only ever
+    # needs that many pooled connections.
+    #
+    # The source can be anything with fetch(ticker, name) (see stonks.sources).
+    # If it also has an async afetch(ticker, name) that is awaited directly,
+    # otherwise fetch() runs on a thread pool the size of `concurrency`, which
+    # is how the default YahooSource (yfinance is synchronous) is run.
+    #
+    # Caching, rate limiting and retries work the same as for FinancialData.
+    def __init__(self, source=None, concurrency=8, limiter=None, retries=0, cache=None, datasets=info.DATASETS):
+        self.source = source or sources.default_source
+        self.concurrency = max(1, concurrency)
+        self.limiter = limiter
+        self.retries = retries
+        self.cache = cache
+        self.datasets = datasets
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # fetch() runs on these threads, see lazy.load().
+        lazy.load('numpy', 'pandas')
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    async def fetch(self, ticker):
+        """
+        Fetch all of the datasets for a single ticker.
+
+        Parameters:
+        - ticker (str): Stock ticker symbol.
+
+        Returns:
+        FinancialData: Data for the ticker with the datasets already loaded.
+        """
+        data = info.FinancialData(ticker, self.limiter, self.retries, self.cache, self.source)
+        values = await asyncio.gather(*(self.load(data, name) for name in self.datasets))
+        data.data = info.LazyData(data.load, loaded=dict(zip(self.datasets, values)))
+        return data
+
+    async def fetch_many(self, tickers):
+        """
+        Fetch all of the datasets for several tickers concurrently.
+
+        Parameters:
+        - tickers (list): Stock ticker symbols.
+
+        Returns:
+        list: FinancialData for each ticker in the order given, or the
+        exception if fetching the ticker failed.
+        """
+        return await asyncio.gather(*(self.fetch(ticker) for ticker in tickers), return_exceptions=True)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    async def load(self, data, name):
+        value = data.cached(name)
+
+        if value is not None:
+            return data.with_quote(name, value)
+
+        try:
+            value = await throttle.retry_async(lambda: self.request(data.ticker, name), self.retries,
+                                               limiter=self.limiter, on_retry=data.count_retry)
+        except Exception as e:
+            if throttle.status_code(e) is None:
+                raise
+            raise data.fetch_error(name, e)
+
+        data.store(name, value)
+
+        return data.with_quote(name, value)
+
+    async def request(self, ticker, name):
+        # The semaphore is only held for the request itself so tickers waiting
+        # on the limiter or a retry don't take up a connection.
+        async with self.semaphore:
+            if hasattr(self.source, 'afetch'):
+                return await self.source.afetch(ticker, name)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.source.fetch, ticker, name)
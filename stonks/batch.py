@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import stonks.numbers as num
+import stonks.scoring as scoring
+import stonks.snapshot as snapshot
+from stonks.metrics import COLUMNS, MetricsTable
+
+# Batch versions of the metrics in finance.py.  Instead of working through one
+# ticker's statements at a time the line items every metric needs are pulled
+# out of each statement for all of the tickers at once (see
+# snapshot.Columns) and stacked into a single wide DataFrame (one row per
+# ticker), then every metric is worked out for all of the tickers at once with
+# column-wise operations.  The canonical items fall back between line items
+# with the same rules as snapshot.Snapshot, so the batch metrics fall back
+# exactly the way the per-ticker ones do.
+
+# Line items read straight from the latest period of each statement, on top
+# of the canonical ones in snapshot.ITEMS.
+LATEST_ITEMS = {
+    'quarterly_balance_sheet': ['Total Debt', 'Stockholders Equity'],
+    'balance_sheet': ['Stockholders Equity'],
+    'income_stmt': ['Net Income', 'Total Revenue'],
+}
+
+# Line items whose whole history is used for growth rates and averages.
+HISTORY_ITEMS = {
+    'income_stmt': ['Total Revenue'],
+    'cashflow': ['Free Cash Flow'],
+}
+
+INFO_FIELDS = ['marketCap', 'currentPrice', 'trailingEps', 'trailingPE', 'currentRatio', 'quickRatio']
+
+def stack(datas):
+    """
+    Stack the line items needed by the metrics for many tickers into one frame.
+
+    Parameters:
+    - datas (dict): Ticker symbol to FinancialData.data mapping.
+
+    Returns:
+    DataFrame: One row per ticker, with a column per canonical line item
+    (see snapshot.ITEMS) and per '<dataset>:<item>'.
+    """
+    # The statements are pulled out one at a time for all of the tickers, and
+    # every column worked out from them whole, never ticker by ticker.
+    statements = snapshot.Columns(datas.values())
+    columns = {item: getattr(statements, item) for item in snapshot.ITEMS}
+    for sheet, items in LATEST_ITEMS.items():
+        periods = statements.statement(sheet)
+        columns.update((f'{sheet}:{item}', periods.get(item)) for item in items)
+
+    for sheet, items in HISTORY_ITEMS.items():
+        periods = statements.statement(sheet)
+        for item in items:
+            stats = zip(('latest', 'oldest', 'periods', 'mean'), periods.history(item))
+            columns.update((f'{sheet}:{item}:{stat}', column) for stat, column in stats)
+
+    infos = [data['info'] for data in datas.values()]
+    for field in INFO_FIELDS:
+        columns[f'info:{field}'] = np.array([np.nan if info.get(field) is None else info.get(field) for info in infos], dtype=float)
+    currencies = [info.get('financialCurrency', None) for info in infos]
+
+    frame = pd.DataFrame(columns, index=pd.Index(list(datas), name='Ticker'))
+    frame.insert(0, 'info:financialCurrency', currencies)
+
+    return frame
+
+def exchange_rates(currencies):
+    # One get_rate() per distinct currency rather than per ticker.
+    rates = {}
+    for currency in pd.unique(currencies):
+        try:
+            rate = num.get_rate(currency)
+        except ValueError:
+            rate = None
+        rates[currency] = np.nan if rate is None else rate
+
+    return currencies.map(rates).astype(float)
+
+def divide(numerator, denominator):
+    return numerator / denominator.where(denominator != 0)
+
+def growth(frame, key):
+    latest = frame[f'{key}:latest']
+    oldest = frame[f'{key}:oldest']
+    return divide((latest - oldest) * 100, oldest) / frame[f'{key}:periods']
+
+def metrics(frame):
+    """
+    Calculate every metric for all of the tickers in a stacked frame.
+
+    Parameters:
+    - frame (DataFrame): Output of stack().
+
+    Returns:
+    DataFrame: One row per ticker with raw (unformatted) metric values.
+    """
+    qb = lambda item: frame[f'quarterly_balance_sheet:{item}']
+    info = lambda field: frame[f'info:{field}']
+
+    rate = exchange_rates(frame['info:financialCurrency'])
+
+    avg_fcf = frame['cashflow:Free Cash Flow:mean'] * rate
+
+    result = pd.DataFrame({
+        'Currency': frame['info:financialCurrency'],
+        'Market Cap': info('marketCap'),
+        'Current Price': info('currentPrice'),
+        'Cash on hand': frame['cash'] * rate,
+        'Current Debt': qb('Total Debt') * rate,
+        # finance.py rounds these three to two decimals before they are scored
+        'Debt to Equity': divide(frame['debt'], qb('Stockholders Equity')).round(2),
+        'Debt to Earnings': divide(frame['debt'], frame['earnings']).round(2),
+        'Earnings Yield': divide(info('trailingEps'), info('currentPrice')).round(2),
+        'Current Ratio': info('currentRatio').fillna(divide(frame['current_assets'], frame['current_liabilities'])),
+        'Quick Ratio': info('quickRatio').fillna(divide(frame['quick_assets'], frame['current_liabilities'])),
+        'Avg Revenue Growth': growth(frame, 'income_stmt:Total Revenue'),
+        'Profit Margin': divide(frame['income_stmt:Net Income'] * 100, frame['income_stmt:Total Revenue']),
+        'Return on Equity': divide(frame['income_stmt:Net Income'] * 100, frame['balance_sheet:Stockholders Equity']),
+        'EPS': info('trailingEps'),
+        'PE': info('trailingPE'),
+        'Avg Cashflow': avg_fcf,
+        'Avg Cashflow Growth': growth(frame, 'cashflow:Free Cash Flow'),
+        'Cashflow Yield': divide(avg_fcf * 100, info('marketCap').where(info('marketCap') > 0)),
+        'Current Ratio Estimated': info('currentRatio').isna(),
+        'Quick Ratio Estimated': info('quickRatio').isna(),
+    })
+
+    return result
+
+def fields(result):
+    # Columns of a metrics() result keyed by TickerMetrics field name.
+    return {name: result[header].to_numpy() for header, name, kind, rule in COLUMNS if header in result}
+
+def table(result):
+    # A metrics() (or run()) result as a MetricsTable, ready for the writers.
+    estimated = {'current_ratio': result['Current Ratio Estimated'].to_numpy(),
+                 'quick_ratio': result['Quick Ratio Estimated'].to_numpy()}
+    currencies = [None if pd.isna(currency) else currency for currency in result['Currency']]
+    return MetricsTable([str(ticker) for ticker in result.index], currencies,
+                        fields(result), estimated)
+
+def score(result, profile=None):
+    # Score every ticker in a metrics() result.
+    return pd.Series(scoring.score_columns(fields(result), profile), index=result.index)
+
+def run(datas, profile=None):
+    # Stack, calculate and score in one go.
+    result = metrics(stack(datas))
+    result['Score'] = score(result, profile)
+    return result
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+import stonks.batch as batch
+import stonks.finance as fin
+import stonks.formatting as fmt
+import stonks.info as info
+import stonks.metrics as metrics
+import stonks.numbers as num
+import stonks.ranking as ranking
+import stonks.sources as sources
+from stonks.cache import Cache
+
+# Benchmarks for the metric and scoring hot paths, run entirely offline on
+# synthetic tickers so the numbers are the same from one run (and machine
+# state) to the next:
+#
+#   python -m stonks.bench --sizes 1 100 10000 --output bench.json
+#   python -m stonks.bench --compare bench.json
+#
+# Every stage is timed over all of the tickers, then run once more under
+# tracemalloc for its peak memory.  --fixtures runs tickers recorded with
+# `stonks --record DIR` instead, repeated as needed to fill each size.
+#
+# --startup checks how long the command line takes to import everything it
+# needs (python -X importtime) on its most common paths against STARTUP_BUDGETS,
+# and that the cached runs (one of them threaded) put out every ticker.
+
+SIZES = [1, 100, 10000]
+
+# Distinct synthetic tickers, bigger runs reuse them (nothing is memoized
+# per dataset so reusing them doesn't make anything cheaper).
+DISTINCT = 200
+
+BALANCE_ITEMS = [
+    'Total Debt', 'Total Liabilities Net Minority Interest', 'Stockholders Equity',
+    'Cash Cash Equivalents And Short Term Investments', 'Cash And Cash Equivalents',
+    'Current Liabilities', 'Current Assets', 'Current Debt', 'Current Deferred Liabilities',
+    'Other Current Liabilities', 'Payables And Accrued Expenses', 'Accounts Payable', 'Payables',
+    'Receivables', 'Inventory', 'Prepaid Assets',
+]
+INCOME_ITEMS = ['Total Revenue', 'Gross Profit', 'Net Income', 'Pretax Income']
+CASHFLOW_ITEMS = ['Free Cash Flow', 'Operating Cash Flow', 'Capital Expenditure']
+
+# Yahoo's statements have 40 to 80 rows and 'info' well over a hundred keys,
+# padding keeps the synthetic ones about as big.
+FILLER_ROWS = 40
+FILLER_FIELDS = 120
+
+FINANCE_STAGES = [
+    'debt_to_equity', 'debt_to_earnings', 'current_debt', 'current_cash', 'earnings_yield',
+    'revenue_growth', 'profit_margin', 'return_on_equity', 'avg_free_cash_flow',
+    'avg_free_cash_flow_change', 'current_ratio', 'quick_ratio',
+]
+
+def statement(rng, items, periods, quarterly):
+    if quarterly:
+        columns = pd.date_range(end='2024-09-30', periods=periods, freq='QE')[::-1]
+    else:
+        columns = pd.date_range(end='2023-12-31', periods=periods, freq='YE')[::-1]
+
+    index = items + [f'Filler Item {i}' for i in range(FILLER_ROWS)]
+    values = rng.uniform(1e7, 1e10, size=(len(index), periods))
+    # A few holes like the real thing.
+    values[rng.random(values.shape) < 0.05] = np.nan
+
+    return pd.DataFrame(values, index=index, columns=columns)
+
+def synthetic_data(seed):
+    """
+    Build a deterministic FinancialData.data stand in for a synthetic ticker.
+
+    Parameters:
+    - seed (int): Seed for the ticker, the same seed always gives the same data.
+
+    Returns:
+    dict: Dataset name to data, the same shape yfinance hands back.
+    """
+    rng = np.random.default_rng(seed)
+
+    data = {
+        'balance_sheet': statement(rng, BALANCE_ITEMS, 4, False),
+        'quarterly_balance_sheet': statement(rng, BALANCE_ITEMS, 5, True),
+        'income_stmt': statement(rng, INCOME_ITEMS, 4, False),
+        'quarterly_income_stmt': statement(rng, INCOME_ITEMS, 5, True),
+        'cashflow': statement(rng, CASHFLOW_ITEMS, 4, False),
+        'quarterly_cashflow': statement(rng, CASHFLOW_ITEMS, 5, True),
+    }
+
+    info = {f'field{i}': float(rng.uniform(0, 1e6)) for i in range(FILLER_FIELDS)}
+    info.update({
+        'financialCurrency': ['USD', 'EUR', 'JPY'][seed % 3],
+        'marketCap': float(rng.uniform(1e8, 1e12)),
+        'currentPrice': float(rng.uniform(1, 500)),
+        'trailingEps': float(rng.uniform(-2, 15)),
+        'trailingPE': float(rng.uniform(5, 60)),
+        # Leave the ratios out of every other ticker so the estimates get run.
+        'currentRatio': None if seed % 2 else float(rng.uniform(0.5, 3)),
+        'quickRatio': None if seed % 2 else float(rng.uniform(0.3, 2)),
+    })
+    data['info'] = info
+
+    return data
+
+def fixture_data(source, ticker):
+    # Everything recorded for a ticker, an empty frame for anything that wasn't.
+    data = {}
+
+    for name in info.DATASETS:
+        try:
+            data[name] = source.fetch(ticker, name)
+        except ValueError:
+            data[name] = {} if name == 'info' else pd.DataFrame()
+
+    return data
+
+def tickers(size, fixtures=None):
+    if fixtures is None:
+        datas = [synthetic_data(seed) for seed in range(min(size, DISTINCT))]
+        names = [f'SYN{i}' for i in range(len(datas))]
+    else:
+        source = sources.FixtureSource(fixtures)
+        names = source.tickers()[:size]
+        datas = [fixture_data(source, ticker) for ticker in names]
+
+    # Repeats get a suffix so every ticker in the universe has its own name.
+    return [(names[i] if i < len(names) else f'{names[i % len(names)]}.{i // len(names)}', datas[i % len(datas)])
+            for i in range(size)]
+
+# Import time budgets in milliseconds for the command line paths run the most,
+# and modules those paths should never import at all.  A cached run still
+# needs pandas to load the cached statements but never yfinance.
+STARTUP_BUDGETS = {
+    'help': (150, ['pandas', 'numpy', 'yfinance', 'currency_converter', 'tabulate', 'requests']),
+    'cached': (800, ['yfinance', 'curl_cffi', 'requests', 'currency_converter']),
+    'cached -w 8': (800, ['yfinance', 'curl_cffi', 'requests', 'currency_converter']),
+}
+
+# USD tickers for the cached run so no exchange rates are needed.
+STARTUP_TICKERS = [0, 3, 6, 9, 12]
+
+def stages(universe):
+    # (name, func) pairs, func(ticker, data) runs the stage for one ticker.
+    # state holds the metrics the scoring and formatting stages work from,
+    # worked out once per distinct dataset.
+    state = {}
+    for ticker, data in universe:
+        if id(data) not in state:
+            state[id(data)] = metrics.collect(ticker, data)
+
+    result = [('make_table', lambda ticker, data: metrics.render(metrics.collect(ticker, data), True))]
+    result.extend((f'finance.{name}', lambda ticker, data, func=getattr(fin, name): func(data))
+                  for name in FINANCE_STAGES)
+    result.extend([
+        ('finance.fcf_yield', lambda ticker, data: fin.fcf_yield(state[id(data)].market_cap, state[id(data)].avg_fcf)),
+        ('finance.calc_score', lambda ticker, data: fin.calc_score(state[id(data)])),
+        ('formatting.colorize', lambda ticker, data: fmt.colorize(f"{state[id(data)].profit_margin:.2f}%", 'high', 10, 15, True)),
+        ('numbers.format_currency', lambda ticker, data: num.format_currency(state[id(data)].market_cap)),
+        ('info.print_data(info)', lambda ticker, data: info.print_data(data, 'info', False)),
+        ('info.print_data(financials)', lambda ticker, data: info.print_data(data, 'financials', False)),
+    ])
+
+    return result
+
+def measure(func, universe, calls=None):
+    # Time func over the universe, then run it again under tracemalloc for
+    # the peak memory (tracing slows everything down so it's kept apart).
+    # calls is the number of tickers handled if that isn't one per item.
+    calls = calls or len(universe)
+    start = time.perf_counter()
+    for ticker, data in universe:
+        func(ticker, data)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for ticker, data in universe:
+        func(ticker, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'calls': calls,
+        'seconds': elapsed,
+        'latency_us': elapsed / calls * 1e6,
+        'throughput': calls / elapsed if elapsed > 0 else float('inf'),
+        'peak_bytes': peak,
+    }
+
+def run(sizes, only=None, fixtures=None):
+    """
+    Run every stage over each universe size.
+
+    Parameters:
+    - sizes (list): Numbers of synthetic tickers to run.
+    - only (list): Only run stages whose name contains one of these.
+    - fixtures (str): Run recorded tickers (see sources.FixtureSource) instead of synthetic ones.
+
+    Returns:
+    list: One result dict per (stage, size).
+    """
+    results = []
+    selected = lambda name: not only or any(part in name for part in only)
+
+    for size in sizes:
+        universe = tickers(size, fixtures)
+
+        # stages() works out the metrics for each distinct ticker up front,
+        # which also warms up the exchange rates and anything loaded lazily.
+        for name, func in stages(universe):
+            if not selected(name):
+                continue
+
+            results.append(dict(stage=name, size=size, **measure(func, universe)))
+
+        # The vectorized batch path does the whole universe in one call.
+        if selected('batch.run'):
+            datas = dict(universe)
+            results.append(dict(stage='batch.run', size=size,
+                                **measure(lambda ticker, datas: batch.run(datas), [(None, datas)], size)))
+
+        # Turning a batch result into records for the writers.
+        if selected('batch.table'):
+            result = batch.run(dict(universe))
+            results.append(dict(stage='batch.table', size=size,
+                                **measure(lambda ticker, result: list(batch.table(result)), [(None, result)], size)))
+
+        # Percentiles and z-scores of every metric by sector across the universe.
+        if selected('ranking.rank'):
+            table = batch.table(batch.run(dict(universe)))
+            table.labels['sector'] = [f'Sector {i % 11}' for i in range(len(table))]
+            results.append(dict(stage='ranking.rank', size=size,
+                                **measure(lambda ticker, table: ranking.rank(table, metrics.NUMERIC, 'sector'), [(None, table)], size)))
+
+    return results
+
+def import_times(argv, env):
+    # Run `python -X importtime -m stonks <argv>` and return the milliseconds
+    # spent importing once stonks itself starts (the interpreter's own start
+    # up isn't ours to fix), the names of every module imported and what the
+    # run wrote to stdout.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'stonks', *argv],
+                            capture_output=True, text=True, env=env)
+    total = 0
+    modules = set()
+    started = False
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+
+        if name.strip() == 'runpy':
+            started = True
+        elif started and not name[1:].startswith(' '):
+            total += int(cumulative)
+
+    return total / 1000, modules, result.stdout
+
+def startup():
+    """
+    Measure the import time of the command line paths in STARTUP_BUDGETS.
+
+    Returns:
+    list: One result dict per path with its time, budget and any modules it
+    imported that it shouldn't have.
+    """
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package, os.environ.get('PYTHONPATH')])))
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        # A cache with everything the tickers need, run once so the metrics
+        # are cached as well.
+        cache = Cache(directory)
+        names = []
+        for seed in STARTUP_TICKERS:
+            names.append(f'SYN{seed}')
+            for name, value in synthetic_data(seed).items():
+                cache.put(names[-1], name, value)
+        cache.close()
+
+        cached = ['--offline', '--csv', '--cache-dir', directory, *names]
+        subprocess.run([sys.executable, '-m', 'stonks', *cached], capture_output=True, env=env)
+
+        # The threaded run is there because deferred imports have to hold up
+        # when several threads are the first to use a module at once.
+        for path, argv in [('help', ['--help']), ('cached', cached), ('cached -w 8', [*cached, '-w', '8'])]:
+            budget, forbidden = STARTUP_BUDGETS[path]
+            ms, modules, output = import_times(argv, env)
+            imported = sorted(name for name in forbidden if name in modules or any(module.startswith(name + '.') for module in modules))
+            rows = {line.split(',', 1)[0] for line in output.splitlines()}
+            failed = [] if path == 'help' else [name for name in names if name not in rows]
+            results.append({'path': path, 'import_ms': ms, 'budget_ms': budget, 'forbidden': imported, 'failed': failed,
+                            'ok': ms <= budget and not imported and not failed})
+
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'time': time.time(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+def report(results, baseline=None):
+    # Results as a table, with the change in latency against a baseline run.
+    old = {(row['stage'], row['size']): row for row in baseline['results']} if baseline else {}
+    rows = []
+
+    for row in results:
+        line = [row['stage'], row['size'], f"{row['latency_us']:.1f}", f"{row['throughput']:.0f}",
+                f"{row['peak_bytes'] / 1024:.0f}"]
+
+        if baseline:
+            before = old.get((row['stage'], row['size']))
+            line.append(f"{(row['latency_us'] / before['latency_us'] - 1) * 100:+.1f}%" if before else '')
+
+        rows.append(line)
+
+    headers = ['Stage', 'Tickers', 'Latency (us)', 'Per second', 'Peak (KiB)']
+    if baseline:
+        headers.append(f"vs {baseline['environment'].get('commit') or 'baseline'}")
+
+    return tabulate(rows, headers=headers, tablefmt='simple')
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m stonks.bench', description='Benchmark the stonks metric and scoring hot paths on synthetic tickers.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help=f'Numbers of tickers to run (default: {" ".join(map(str, SIZES))})')
+    parser.add_argument('--only', type=str, nargs='+', help='Only run stages whose name contains one of these')
+    parser.add_argument('-o', '--output', type=str, help='Write the results as JSON to this file')
+    parser.add_argument('--fixtures', type=str, metavar='DIR', help='Run tickers recorded with stonks --record DIR instead of synthetic ones')
+    parser.add_argument('--startup', action='store_true', help='Check the command line import times against their budgets instead')
+    parser.add_argument('--compare', type=str, metavar='FILE', help='JSON results of an earlier run to compare against')
+
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+
+    if args.startup:
+        results = startup()
+        print(tabulate([[row['path'], f"{row['import_ms']:.1f}", row['budget_ms'], ', '.join(row['forbidden']),
+                         ', '.join(row['failed']), 'ok' if row['ok'] else 'FAIL'] for row in results],
+                       headers=['Path', 'Imports (ms)', 'Budget (ms)', 'Should not import', 'Tickers failed', ''],
+                       tablefmt='simple'))
+    else:
+        results = run(args.sizes, args.only, args.fixtures)
+        print(report(results, baseline))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent=2)
+
+    if args.startup and not all(row['ok'] for row in results):
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+MINUTE = 60
+DAY = 24 * 60 * MINUTE
+
+# How long each dataset stays fresh.  Statements only change when a company
+# files (once a quarter) so they can be kept for days, 'info' carries the
+# current price so it goes stale in minutes.
+TTL = {
+    'balance_sheet': 7 * DAY,
+    'quarterly_balance_sheet': DAY,
+    'cashflow': 7 * DAY,
+    'quarterly_cashflow': DAY,
+    'income_stmt': 7 * DAY,
+    'quarterly_income_stmt': DAY,
+    'info': 15 * MINUTE,
+}
+
+# When the price fields in 'info' are refreshed from a bulk quote (--quotes)
+# the rest of it is only fundamentals and can be kept as long as the quarterly
+# statements.
+QUOTED_TTL = dict(TTL, info=DAY)
+
+def default_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'stonks')
+
+def is_empty(value):
+    # yfinance hands back an empty DataFrame (or dict) instead of raising when
+    # something goes wrong so we don't want to hang on to those.
+    if value is None:
+        return True
+    if hasattr(value, 'empty'):
+        return value.empty
+    return len(value) == 0
+
+class Cache:
+    # On-disk cache of the raw Yahoo datasets keyed by ticker and dataset name.
+    #
+    # refresh   =   Ignore what is cached and always go to the network (the
+    #                 fresh data is still written back to the cache).
+    # offline   =   Never go to the network, serve whatever is cached no matter
+    #                 how old it is.
+    def __init__(self, path=None, refresh=False, offline=False):
+        self.path = path or default_dir()
+        self.refresh = refresh
+        self.offline = offline
+        self.lock = threading.Lock()
+
+        os.makedirs(self.path, exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(self.path, 'cache.db'), check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS datasets ('
+            ' ticker TEXT NOT NULL,'
+            ' name TEXT NOT NULL,'
+            ' fetched REAL NOT NULL,'
+            ' value BLOB NOT NULL,'
+            ' PRIMARY KEY (ticker, name))'
+        )
+        # Metrics worked out from the datasets, keyed by a hash of everything
+        # that went into them (see metrics.inputs_digest).
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' ticker TEXT PRIMARY KEY,'
+            ' inputs TEXT NOT NULL,'
+            ' value BLOB NOT NULL)'
+        )
+
+    def get(self, ticker, name, ttl=None):
+        # Return the cached dataset or None if it isn't cached or has gone stale
+        # (by the ttl given in seconds, or TTL for the dataset).
+        if self.refresh and not self.offline:
+            return None
+
+        with self.lock:
+            row = self.db.execute('SELECT fetched, value FROM datasets WHERE ticker = ? AND name = ?',
+                                  (ticker.upper(), name)).fetchone()
+
+        if row is None:
+            return None
+
+        fetched, value = row
+
+        if ttl is None:
+            ttl = TTL.get(name, 0)
+
+        if not self.offline and time.time() - fetched > ttl:
+            return None
+
+        return pickle.loads(value)
+
+    def put(self, ticker, name, value):
+        if is_empty(value):
+            return
+
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO datasets (ticker, name, fetched, value) VALUES (?, ?, ?, ?)',
+                            (ticker.upper(), name, time.time(), blob))
+
+    def get_result(self, ticker, inputs):
+        # Return the result stored for the ticker if it was worked out from the
+        # same inputs, the inputs hash is all that matters so age doesn't.
+        with self.lock:
+            row = self.db.execute('SELECT value FROM results WHERE ticker = ? AND inputs = ?',
+                                  (ticker.upper(), inputs)).fetchone()
+
+        return None if row is None else pickle.loads(row[0])
+
+    def put_result(self, ticker, inputs, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO results (ticker, inputs, value) VALUES (?, ?, ?)',
+                            (ticker.upper(), inputs, blob))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -1,5 +1,5 @@
 import re
-import pandas as pd
+import math
 
 # def colorize(value, condition, low_threshold, high_threshold, use_color):
 #     # This function will take a numeric value and colorize it either red, yellow, 
@@ -80,33 +80,18 @@ def colorize(value, condition, low_threshold, high_threshold, use_color):
     value_str = value_str.rstrip('%')
 
     # Extract numeric part of the value and convert to float
-    value_num = pd.to_numeric(value_str, errors='coerce')
-    
-    if pd.notna(value_num):
-        value_float = float(value_num)
-    else:
+    try:
+        value_float = float(value_str)
+    except ValueError:
+        return value
+
+    if math.isnan(value_float):
         return value
 
     if not use_color:
         return value
 
-    # Make condition determinations
-    if condition == "high":
-        if value_float > high_threshold:
-            color = '\033[92m'  # Green
-        elif low_threshold <= value_float <= high_threshold:
-            color = '\033[93m'  # Yellow
-        else:
-            color = '\033[91m'  # Red
-    elif condition == "low":
-        if value_float > high_threshold:
-            color = '\033[91m'  # Red
-        elif low_threshold <= value_float <= high_threshold:
-            color = '\033[93m'  # Yellow
-        else:
-            color = '\033[92m'  # Green
-    else:
-        color = '\033[0m'  # Default color
+    color = color_code(value_float, condition, low_threshold, high_threshold)
 
     # Convert value to a 2 digit float
     formatted_value = f"{value_float:.2f}"
@@ -121,6 +106,51 @@ def colorize(value, condition, low_threshold, high_threshold, use_color):
     # Print value with color. If there is a suffix, percent sign, or negative sign, add them back on.
     return f"{color}{formatted_value}{reset_color}"
     
+# Terminal color for each band color_code() can put a value in.
+BANDS = {
+    'green': '\033[92m',
+    'yellow': '\033[93m',
+    'red': '\033[91m',
+    None: '\033[0m',
+}
+
+def band(value, condition, low_threshold, high_threshold):
+    # Which band a numeric value falls in: 'green', 'yellow' or 'red'.
+    #
+    # condition         =   'low' or 'high'
+    #                       If condition is 'low' being less than threshold is green
+    #                       If condition is 'high' being greater than threshold is green
+    if condition == "high":
+        if value > high_threshold:
+            return 'green'
+        elif low_threshold <= value <= high_threshold:
+            return 'yellow'
+        else:
+            return 'red'
+    elif condition == "low":
+        if value > high_threshold:
+            return 'red'
+        elif low_threshold <= value <= high_threshold:
+            return 'yellow'
+        else:
+            return 'green'
+
+    return None
+
+def color_code(value, condition, low_threshold, high_threshold):
+    # Pick red, yellow or green for a numeric value.
+    return BANDS[band(value, condition, low_threshold, high_threshold)]
+
+def paint(text, value, condition, low_threshold, high_threshold, use_color):
+    # Color already formatted text based on the raw numeric value behind it, so
+    # unlike colorize() nothing has to be parsed back out of the text.
+    if not use_color or value is None or math.isnan(value):
+        return text
+
+    color = color_code(value, condition, low_threshold, high_threshold)
+
+    return f"{color}{text}\033[0m"
+
 def remove_color(value):
     # Remove all color values from input.
     if isinstance(value, str):
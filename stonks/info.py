@@ -1,7 +1,25 @@
-import yfinance as yf
+import hashlib
 import json
-import pandas as pd
-import requests.exceptions
+import threading
+from collections.abc import Mapping
+import stonks.lazy as lazy
+import stonks.sources as sources
+import stonks.throttle as throttle
+import stonks.timing as timing
+from stonks.cache import QUOTED_TTL
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+DATASETS = (
+    'balance_sheet',
+    'quarterly_balance_sheet',
+    'cashflow',
+    'quarterly_cashflow',
+    'info',
+    'income_stmt',
+    'quarterly_income_stmt',
+)
 
 def get_income(data, duration):
     if duration:
@@ -42,36 +60,175 @@ def frame_to_json(frame):
 
     return json.dumps(data_list, indent=2)
 
+# Tickers per bulk quote request, Yahoo starts turning requests away somewhere
+# past a few hundred.
+QUOTE_BATCH = 100
+
+class LazyData(Mapping):
+    # Read only mapping of dataset name to data that only calls load(name) the
+    # first time a dataset is asked for and hangs on to the result.  This way
+    # --info balance only costs the one request to Yahoo instead of all of them.
+    def __init__(self, load, names=DATASETS, loaded=None):
+        self.load = load
+        self.names = names
+        self.loaded = dict(loaded or {})
+        self.lock = threading.Lock()
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+
+        with self.lock:
+            if name not in self.loaded:
+                self.loaded[name] = self.load(name)
+
+            return self.loaded[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
 class FinancialData:
-    def __init__(self, ticker):
+    def __init__(self, ticker, limiter=None, retries=0, cache=None, source=None, quote=None):
         self.ticker = ticker
+        self.limiter = limiter
+        self.retries = retries
+        self.cache = cache
+        self.source = source or sources.default_source
+        # Fresh price fields from fetch_quotes() to use over the ones in 'info'.
+        self.quote = quote
+        self.retried = 0
         self.fetch_data()
 
     def fetch_data(self):
+        # Nothing is actually fetched until a dataset is accessed through self.data
+        self.data = LazyData(self.load)
+
+    def load(self, name):
         try:
-            data = yf.Ticker(self.ticker)
-            self.data = {
-                'balance_sheet': data.balance_sheet,
-                'quarterly_balance_sheet': data.quarterly_balance_sheet,
-                'cashflow': data.cashflow,
-                'info': data.info,
-                'income_stmt': data.income_stmt,
-                'quarterly_income_stmt': data.quarterly_income_stmt
-            }
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                print(f"Error: Ticker '{self.ticker}' not found.")
-            else:
-                print(f"Error: {e}")
-            self.data = None
+            return self.with_quote(name, self.fetch(name))
+        except Exception as e:
+            # Only HTTP errors (anything with a response) get turned into a
+            # friendlier message.
+            if throttle.status_code(e) is None:
+                raise
+            raise self.fetch_error(name, e)
 
-def print_data(data, type, duration):
-    pd.set_option('display.max_rows', None)
+    def with_quote(self, name, value):
+        if name != 'info' or not self.quote:
+            return value
+
+        return {**value, **self.quote}
+
+    def fetch_error(self, name, error):
+        # Turn an HTTP error into the message we show for the ticker.
+        if error.response is not None and error.response.status_code == 404:
+            return sources.NotFound(f"Ticker '{self.ticker}' not found.")
+        return ValueError(f"Failed to fetch '{name}': {error}")
+
+    def count_retry(self, error):
+        self.retried += 1
+
+    def cached(self, name):
+        # The cached dataset or None, raises if it isn't cached and we are offline.
+        if self.cache is None:
+            return None
+
+        # With a quote only the fundamentals in 'info' are used so an older
+        # copy of it will do.
+        ttl = QUOTED_TTL.get(name) if self.quote else None
+        value = self.cache.get(self.ticker, name, ttl)
+
+        if value is None and self.cache.offline:
+            raise ValueError(f"'{name}' is not cached and --offline was given")
+
+        return value
+
+    def store(self, name, value):
+        if self.cache is not None:
+            self.cache.put(self.ticker, name, value)
+
+    def fetch(self, name):
+        # Each dataset is its own request to Yahoo so each one is cached, goes
+        # through the rate limiter and gets retried on its own.
+        with timing.timed('cache.get'):
+            value = self.cached(name)
+
+        if value is not None:
+            return value
+
+        with timing.timed(f'fetch.{name}'):
+            value = throttle.retry(lambda: self.source.fetch(self.ticker, name), self.retries,
+                                   limiter=self.limiter, on_retry=self.count_retry)
+
+        with timing.timed('cache.put'):
+            self.store(name, value)
+
+        return value
+
+def fetch_quotes(tickers, source=None, limiter=None, retries=0, batch_size=QUOTE_BATCH):
+    """
+    Fetch the price fields of 'info' for many tickers with one request per batch.
 
+    Parameters:
+    - tickers (list): Stock ticker symbols.
+    - source: Data source with a quotes() method, defaults to Yahoo.
+    - limiter (RateLimiter): Rate limiter shared by all requests to Yahoo.
+    - retries (int): Number of retries for throttled or failed requests.
+    - batch_size (int): Number of tickers to ask for per request.
+
+    Returns:
+    dict: Upper case ticker to its price fields, for the tickers Yahoo knows.
+    """
+    source = source or sources.default_source
+    tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    quotes = {}
+
+    for start in range(0, len(tickers), batch_size):
+        batch = tickers[start:start + batch_size]
+        quotes.update(throttle.retry(lambda: source.quotes(batch), retries, limiter=limiter))
+
+    return quotes
+
+def digest(value, fields=None):
+    """
+    Content hash of a dataset: the row and column (period) labels and values of
+    a statement, or the values of an info dict.
+
+    Parameters:
+    - value: A dataset from FinancialData.data.
+    - fields (list): Only hash these keys of a dict (e.g. the fields a metric uses).
+
+    Returns:
+    str: Hex digest of the dataset.
+    """
+    sha = hashlib.sha256()
+
+    if isinstance(value, pd.DataFrame):
+        # Statements are small so hashing the raw bytes is a lot quicker than
+        # pd.util.hash_pandas_object(), which only pays off on big frames.
+        sha.update('\0'.join(map(str, value.columns.tolist())).encode())
+        sha.update('\0'.join(map(str, value.index.tolist())).encode())
+        values = value.to_numpy()
+        sha.update(values.tobytes() if values.dtype != object else repr(values.tolist()).encode())
+    else:
+        value = value or {}
+        if fields is not None:
+            value = {field: value.get(field) for field in fields}
+        sha.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+    return sha.hexdigest()
+
+def get_data(data, type, duration):
+    # The raw data behind --info: the info dict, or the requested statements
+    # combined into one frame with 'sheet' and 'item' columns and a column per
+    # period.
     result = {}
 
     if type == 'info':
-        return json.dumps(data['info'], indent=2)
+        return data['info']
     
     if type == 'balance' or type == 'financials':
         result['balance'] = get_balance(data, duration)
@@ -86,4 +243,53 @@ def print_data(data, type, duration):
     combined = combined.reset_index()
     combined = combined.rename(columns={'level_0': 'sheet', 'level_1': 'item'})
 
-    return combined.to_string(index=False)
+    return combined
+
+def format_data(result, type):
+    pd.set_option('display.max_rows', None)
+
+    if type == 'info':
+        return json.dumps(result, indent=2)
+
+    return result.to_string(index=False)
+
+def long_data(ticker, result, type):
+    # Reshape --info data into one row per (ticker, sheet, item, period, value)
+    # which is what the columnar outputs write.  Only the numeric fields of
+    # 'info' fit in that layout.
+    if type == 'info':
+        values = {key: value for key, value in result.items()
+                  if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        frame = pd.DataFrame({'sheet': 'info', 'item': list(values), 'period': pd.NaT, 'value': list(values.values())})
+    else:
+        periods = result.columns[2:]
+        rows = len(result)
+        frame = pd.DataFrame({
+            'sheet': np.tile(result['sheet'].to_numpy(), len(periods)),
+            'item': np.tile(result['item'].to_numpy(), len(periods)),
+            'period': np.repeat(periods.to_numpy(), rows),
+            'value': result[periods].to_numpy().ravel(order='F'),
+        })
+
+    frame.insert(0, 'ticker', ticker.upper())
+    frame['item'] = frame['item'].astype(str)
+    frame['period'] = pd.to_datetime(frame['period'])
+    frame['value'] = pd.to_numeric(frame['value'], errors='coerce')
+
+    return frame.dropna(subset=['value'])
+
+def print_data(data, type, duration):
+    return format_data(get_data(data, type, duration), type)
+
+class InfoResult:
+    # The --info data for one ticker as handed to the output writers.
+    def __init__(self, ticker, type, result):
+        self.ticker = ticker
+        self.type = type
+        self.result = result
+
+    def text(self):
+        return format_data(self.result, self.type)
+
+    def long(self):
+        return long_data(self.ticker, self.result, self.type)
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+import stonks.metrics as metrics
+
+class Journal:
+    # Checkpoint journal for long runs.  Every ticker that finishes gets a line
+    # of JSON appended (and flushed) with whether it worked, how many requests
+    # had to be retried and its metrics, so a run that dies halfway through can
+    # pick up where it left off with --resume instead of starting over.
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            self.load()
+            self.repair()
+            self.file = open(path, 'a')
+        else:
+            self.file = open(path, 'w')
+
+    def load(self):
+        with open(self.path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short if the run was killed
+                    # while writing it.
+                    continue
+
+                # Later entries for a ticker (e.g. a retried failure) win.
+                self.entries[entry['ticker']] = entry
+
+    def repair(self):
+        # Make sure the file ends with a complete line before appending to it,
+        # otherwise the first new entry would run on from a line cut short and
+        # be skipped along with it next time.  A cut short line is dropped (it
+        # was skipped by load() too), a whole entry missing its newline gets one.
+        with open(self.path, 'rb+') as file:
+            data = file.read()
+            if not data or data.endswith(b'\n'):
+                return
+
+            end = data.rfind(b'\n') + 1
+            try:
+                json.loads(data[end:])
+                file.write(b'\n')
+            except ValueError:
+                file.truncate(end)
+
+    def record(self, ticker, result=None, error=None, retries=0):
+        entry = {
+            'ticker': ticker,
+            'status': 'failed' if error else 'ok',
+            'retries': retries,
+            'error': error,
+            'time': time.time(),
+            # Only metrics are kept.  --info results are just marked as info
+            # and are fetched again on --resume rather than left out.
+            'result': metrics.as_row(result) if isinstance(result, metrics.TickerMetrics) else None,
+            'info': result is not None and not isinstance(result, metrics.TickerMetrics),
+        }
+
+        with self.lock:
+            self.entries[ticker] = entry
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+
+    def completed(self, ticker):
+        # The entry for a ticker that already finished successfully, or None.
+        # --info entries don't count, their output wasn't kept.
+        entry = self.entries.get(ticker)
+        if entry is None or entry['status'] != 'ok' or entry.get('info'):
+            return None
+        return entry
+
+    def close(self):
+        with self.lock:
+            self.file.close()
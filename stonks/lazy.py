@@ -0,0 +1,47 @@
+import importlib.util
+import sys
+import types
+
+# pandas, numpy, yfinance and friends take the better part of a second to
+# import, which is most of the time `stonks --help` or a run served from the
+# cache takes.  Modules that only need them on some code paths import them
+# with module() so they are only loaded the first time they are used.
+#
+# This isn't importlib's LazyLoader: on 3.11 a module it loads can be seen
+# half initialised by other threads using it at the same time.  A Module
+# imports the real thing with a normal import, which other threads wait on.
+# Code about to start a pool of threads calls load() first anyway, so the
+# import happens once, up front, rather than in whichever thread gets there.
+
+class Module(types.ModuleType):
+    # Stands in for a module until one of its attributes is used, then takes
+    # on the real module's attributes so later lookups don't come through
+    # here at all.
+    def __getattr__(self, name):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+def module(name):
+    """
+    Import a module lazily.
+
+    Parameters:
+    - name (str): Name of a top level module, e.g. 'pandas'.
+
+    Returns:
+    module: The module if it has already been imported, otherwise a stand in
+    that imports it the first time one of its attributes is used.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+
+    return Module(name)
+
+def load(*names):
+    # Import modules now, before any threads that use them are started.
+    for name in names:
+        importlib.import_module(name)
@@ -0,0 +1,219 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import stonks.metrics as metrics
+import stonks.ranking as ranking
+
+# `stonks merge` puts the outputs of a run split up with --shard back together:
+#
+#   stonks -f universe.txt --csv -H --shard 0/2 > part0.csv     (on one machine)
+#   stonks -f universe.txt --csv -H --shard 1/2 > part1.csv     (on another)
+#   stonks merge -f universe.txt part0.csv part1.csv > all.csv
+#
+# CSV, JSON Lines, Parquet and Arrow outputs can be merged (all of the inputs
+# have to be the same format).  The result has a single header and is in the
+# order of the ticker list given with -f, or sorted by --sort-by (to redo a
+# --top across the shards), or else by ticker.
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12, 'Q': 1e15}
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Can't merge '{path}', expected one of: {', '.join(FORMATS)}")
+    return FORMATS[extension]
+
+def number(value):
+    # A value as written by the text formats ('2.78T', '12.04%', '1.54*',
+    # 'NaN') back as a float, NaN if it isn't a number.
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return math.nan
+
+    text = value.strip().rstrip('*').rstrip('%')
+    scale = SUFFIXES.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+
+    try:
+        return float(text) * scale
+    except ValueError:
+        return math.nan
+
+def read_csv(path):
+    # Returns the header (None if the file hasn't got one) and the rows.
+    with open(path, newline='') as file:
+        rows = list(csv.reader(file))
+
+    if rows and rows[0] and rows[0][0] == metrics.HEADER[0]:
+        return rows[0], rows[1:]
+    return None, rows
+
+def read_jsonl(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def read_table(path, format):
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Merging Parquet and Arrow files needs pyarrow, install it with: pip install pyarrow")
+
+    if format == 'parquet':
+        return pyarrow.parquet.read_table(path)
+    return pyarrow.ipc.open_file(path).read_all()
+
+def read(paths, format):
+    """
+    Read the shard outputs.
+
+    Parameters:
+    - paths (list): Files to merge, all in the same format.
+    - format (str): 'csv', 'jsonl', 'parquet' or 'arrow'.
+
+    Returns:
+    tuple: The column names (None for CSV without a header), the rows (lists
+    for CSV, dicts otherwise) and for Parquet and Arrow the schema.
+    """
+    if format == 'csv':
+        header, rows = None, []
+        for path in paths:
+            file_header, file_rows = read_csv(path)
+            header = header or file_header
+            rows.extend(file_rows)
+        return header, rows, None
+
+    if format == 'jsonl':
+        rows = [row for path in paths for row in read_jsonl(path)]
+        return list(rows[0]) if rows else None, rows, None
+
+    import pyarrow
+
+    tables = [read_table(path, format) for path in paths]
+    table = pyarrow.concat_tables(tables, promote_options='default')
+    return table.column_names, table.to_pylist(), table.schema
+
+def column_index(name, columns):
+    # Where a field (or header) is among the columns, field names are looked up
+    # by their header for the text formats.
+    if name in columns:
+        return columns.index(name)
+
+    headers = {column[1]: column[0] for column in metrics.COLUMNS + ranking.columns(metrics.NUMERIC)}
+    if headers.get(name) in columns:
+        return columns.index(headers[name])
+
+    raise ValueError(f"No column '{name}' to sort by, the files have: {', '.join(columns)}")
+
+def order(rows, columns, tickers=None, sort_by=None, ascending=False):
+    """
+    Put the merged rows in order.
+
+    Parameters:
+    - rows (list): Rows from read().
+    - columns (list): Their column names.
+    - tickers (list): The original ticker list, rows are put back in its order.
+    - sort_by (str): Field or header to sort by instead, highest first.
+    - ascending (bool): Sort lowest first.
+
+    Returns:
+    list: The rows in order.
+    """
+    value = (lambda row, i: row[i]) if rows and isinstance(rows[0], list) else (lambda row, i: row[columns[i]])
+    ticker_column = 0 if columns is None else next((i for i, name in enumerate(columns) if name.lower() == 'ticker'), 0)
+    ticker = lambda row: str(value(row, ticker_column)).upper()
+
+    if sort_by is not None:
+        if columns is None:
+            raise ValueError("--sort-by needs the CSV files to have a header (-H)")
+        index = column_index(sort_by, columns)
+
+        def key(row):
+            # NaN goes last either way.
+            result = number(value(row, index))
+            if math.isnan(result):
+                return (1, 0)
+            return (0, result if ascending else -result)
+
+        return sorted(rows, key=key)
+
+    if tickers is not None:
+        position = {}
+        for i, name in enumerate(tickers):
+            position.setdefault(name.replace('/', '-').replace('.', '-').upper(), i)
+        return sorted(rows, key=lambda row: position.get(ticker(row), len(position)))
+
+    return sorted(rows, key=ticker)
+
+def write(rows, columns, schema, format, output=None):
+    if format == 'csv':
+        file = open(output, 'w', newline='') if output else sys.stdout
+        writer = csv.writer(file)
+        if columns is not None:
+            writer.writerow(columns)
+        writer.writerows(rows)
+    elif format == 'jsonl':
+        file = open(output, 'w') if output else sys.stdout
+        for row in rows:
+            file.write(json.dumps(row, separators=(',', ':')) + '\n')
+    else:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        table = pyarrow.Table.from_pylist(rows, schema=schema)
+        if format == 'parquet':
+            pyarrow.parquet.write_table(table, output)
+        else:
+            with pyarrow.ipc.new_file(output, table.schema) as sink:
+                sink.write_table(table)
+        return
+
+    if output:
+        file.close()
+    else:
+        file.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='stonks merge', description='Merge the outputs of a run split up with --shard into one.')
+    parser.add_argument('inputs', nargs='+', help='Shard outputs (.csv, .jsonl, .parquet or .arrow)')
+    parser.add_argument('-o', '--output', type=str, help='File to write to (default: stdout, required for Parquet and Arrow)')
+    parser.add_argument('-f', '--file', type=str, help='The ticker list the shards were run with, to put the rows back in its order')
+    parser.add_argument('--sort-by', type=str, metavar='FIELD', help='Sort by a field instead, highest first')
+    parser.add_argument('--ascending', action='store_true', help='With --sort-by, lowest first')
+    parser.add_argument('--top', type=int, metavar='K', help='Only keep the first K rows (e.g. to redo --top across the shards)')
+
+    args = parser.parse_args(argv)
+
+    try:
+        formats = {file_format(path) for path in args.inputs}
+        if len(formats) > 1:
+            raise ValueError(f"Can't merge different formats: {', '.join(sorted(formats))}")
+        format = formats.pop()
+
+        if format in ('parquet', 'arrow') and not args.output:
+            raise ValueError(f"Merging {format} files needs an --output file")
+
+        tickers = None
+        if args.file:
+            with open(args.file, 'r') as file:
+                tickers = [line for line in file.read().splitlines() if line]
+
+        columns, rows, schema = read(args.inputs, format)
+        rows = order(rows, columns, tickers, args.sort_by, args.ascending)
+    except (ValueError, ImportError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.top is not None:
+        rows = rows[:args.top]
+
+    write(rows, columns if format == 'csv' else None, schema, format, args.output)
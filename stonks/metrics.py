@@ -0,0 +1,455 @@
+import hashlib
+import json
+import math
+from dataclasses import dataclass, field, fields
+import stonks.numbers as num
+import stonks.finance as fin
+import stonks.formatting as fmt
+import stonks.info as info_data
+import stonks.lazy as lazy
+import stonks.scoring as scoring
+import stonks.snapshot as snapshot
+import stonks.timing as timing
+
+np = lazy.module('numpy')
+
+@dataclass(slots=True)
+class TickerMetrics:
+    # Raw metric values for a single ticker.  Everything is kept as a plain
+    # float (NaN when it couldn't be worked out) and is only formatted and
+    # colored when it gets rendered, so scoring never has to parse text.
+    # Slotted so holding on to lots of them (e.g. in `stonks serve`) doesn't
+    # cost a dict per record, see MetricsTable for whole universes.
+    #
+    # estimated holds the names of the fields that had to be worked out from
+    # the statements rather than taken from Yahoo (shown with a '*').  The
+    # sector and industry aren't output, they are there to group tickers by
+    # (see ranking.py).
+    ticker: str
+    currency: str = None
+    market_cap: float = math.nan
+    current_price: float = math.nan
+    cash: float = math.nan
+    debt: float = math.nan
+    debt_to_equity: float = math.nan
+    debt_to_earnings: float = math.nan
+    earnings_yield: float = math.nan
+    current_ratio: float = math.nan
+    quick_ratio: float = math.nan
+    revenue_growth: float = math.nan
+    profit_margin: float = math.nan
+    return_on_equity: float = math.nan
+    eps: float = math.nan
+    pe: float = math.nan
+    avg_fcf: float = math.nan
+    avg_fcf_growth: float = math.nan
+    fcf_yield: float = math.nan
+    score: float = math.nan
+    sector: str = None
+    industry: str = None
+    estimated: frozenset = field(default_factory=frozenset)
+
+# Output columns in order: (header, TickerMetrics field, format, color rule).
+# The color rule is (condition, low threshold, high threshold) for
+# formatting.paint() or None to leave the value uncolored.
+COLUMNS = [
+    ("Ticker", 'ticker', 'text', None),
+    ("Currency", 'currency', 'text', None),
+    ("Market Cap", 'market_cap', 'currency', None),
+    ("Current Price", 'current_price', 'currency', None),
+    ("Cash on hand", 'cash', 'currency', None),
+    ("Current Debt", 'debt', 'currency', None),
+    ("Debt to Equity", 'debt_to_equity', 'number', ("low", 0.5, 1)),
+    ("Debt to Earnings", 'debt_to_earnings', 'number', ("low", 1, 2)),
+    ("Earnings Yield", 'earnings_yield', 'number', ("high", 1, 2)),
+    ("Current Ratio", 'current_ratio', 'number', ("high", 1, 1)),
+    ("Quick Ratio", 'quick_ratio', 'number', ("high", 1, 1)),
+    ("Avg Revenue Growth", 'revenue_growth', 'percent', ("high", 8, 12)),
+    ("Profit Margin", 'profit_margin', 'percent', ("high", 10, 15)),
+    ("Return on Equity", 'return_on_equity', 'percent', ("high", 10, 15)),
+    ("EPS", 'eps', 'number', ("high", 3, 8)),
+    ("PE", 'pe', 'number', None),
+    ("Avg Cashflow", 'avg_fcf', 'currency', ("high", 0, 1)),
+    ("Avg Cashflow Growth", 'avg_fcf_growth', 'percent', ("high", 5, 10)),
+    ("Cashflow Yield", 'fcf_yield', 'percent', ("high", 0, 5)),
+    ("Score", 'score', 'integer', ("high", 20, 28)),
+]
+
+HEADER = [column[0] for column in COLUMNS]
+
+# TickerMetrics fields that can be estimates.
+ESTIMATED = ['current_ratio', 'quick_ratio']
+
+# TickerMetrics fields holding text, and the ones holding numbers.
+TEXT = ['ticker', 'currency', 'sector', 'industry']
+NUMERIC = [f.name for f in fields(TickerMetrics) if f.name not in TEXT and f.name != 'estimated']
+
+# Every TickerMetrics field, in order.
+FIELDS = [f.name for f in fields(TickerMetrics) if f.name != 'estimated']
+
+@dataclass(frozen=True, slots=True)
+class Metric:
+    # How one value is worked out: calculate(data, values) gets the datasets
+    # and the values worked out so far, which include everything in requires.
+    calculate: object
+    datasets: tuple = ()
+    requires: tuple = ()
+
+def from_info(key):
+    # A number straight out of 'info'.
+    return Metric(lambda data, values: num.to_float(data['info'].get(key, None)), ('info',))
+
+def from_finance(func, dollars=False):
+    # A finance.* metric of the datasets (see finance.uses()), converted from
+    # the financial currency to dollars if dollars is set.
+    if dollars:
+        return Metric(lambda data, values: num.to_float(num.exchange_currency(func(data), values['exchange_rate'])),
+                      func.datasets, ('exchange_rate',))
+
+    return Metric(lambda data, values: num.to_float(func(data)), func.datasets)
+
+# Every TickerMetrics field (bar the ticker and score) and how to work it out.
+# collect() only works out the fields asked for and what they require, so only
+# the datasets those read get fetched.  The score requires whatever the
+# scoring profile has rules for.
+METRICS = {
+    'currency': Metric(lambda data, values: data['info'].get('financialCurrency', None), ('info',)),
+    'sector': Metric(lambda data, values: data['info'].get('sector', None), ('info',)),
+    'industry': Metric(lambda data, values: data['info'].get('industry', None), ('info',)),
+    # Not a field, the rate currency amounts are converted to dollars at.
+    'exchange_rate': Metric(lambda data, values: num.get_rate(values['currency']), (), ('currency',)),
+    'market_cap': from_info('marketCap'),
+    'current_price': from_info('currentPrice'),
+    'cash': from_finance(fin.current_cash, dollars=True),
+    'debt': from_finance(fin.current_debt, dollars=True),
+    'debt_to_equity': from_finance(fin.debt_to_equity),
+    'debt_to_earnings': from_finance(fin.debt_to_earnings),
+    'earnings_yield': from_finance(fin.earnings_yield),
+    'current_ratio': from_finance(fin.current_ratio),
+    'quick_ratio': from_finance(fin.quick_ratio),
+    'revenue_growth': from_finance(fin.revenue_growth),
+    'profit_margin': from_finance(fin.profit_margin),
+    'return_on_equity': from_finance(fin.return_on_equity),
+    'eps': from_info('trailingEps'),
+    'pe': from_info('trailingPE'),
+    'avg_fcf': from_finance(fin.avg_free_cash_flow, dollars=True),
+    'avg_fcf_growth': from_finance(fin.avg_free_cash_flow_change),
+    'fcf_yield': Metric(lambda data, values: num.to_float(fin.fcf_yield(values['market_cap'], values['avg_fcf'])),
+                        (), ('market_cap', 'avg_fcf')),
+}
+
+# 'info' fields telling whether a ratio is an estimate (see ESTIMATED).
+ESTIMATE_KEYS = {'current_ratio': 'currentRatio', 'quick_ratio': 'quickRatio'}
+
+def parse_fields(text):
+    """
+    Parse a --fields list.
+
+    Parameters:
+    - text (str): Comma separated field names (e.g. fcf_yield) or column
+      headers (e.g. Cashflow Yield), in any case.
+
+    Returns:
+    list: The TickerMetrics field names, in output order.
+    """
+    names = {}
+    for header, name, kind, rule in COLUMNS:
+        names[name.lower()] = name
+        names[header.lower()] = name
+
+    wanted = set()
+    for part in text.split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if part not in names:
+            raise ValueError(f"Unknown field '{part}', expected one of: {', '.join(column[1] for column in COLUMNS)}")
+        wanted.add(names[part])
+
+    return [column[1] for column in COLUMNS if column[1] in wanted]
+
+def resolve(names=None, profile=None):
+    """
+    Work out everything that has to be calculated for a set of fields.
+
+    Parameters:
+    - names (list): TickerMetrics field names, defaults to all of them.
+    - profile (dict): Scoring profile, defaults to scoring.DEFAULT_PROFILE.
+
+    Returns:
+    list: The names in METRICS (and 'score') to calculate, each one after
+    everything it requires.
+    """
+    profile = profile or scoring.DEFAULT_PROFILE
+    order = []
+
+    def visit(name):
+        if name in order or name == 'ticker':
+            return
+        if name == 'score':
+            requires = [rule['metric'] for rule in profile['rules']]
+        elif name in METRICS:
+            requires = METRICS[name].requires
+        else:
+            raise ValueError(f"Unknown metric '{name}'")
+
+        for required in requires:
+            visit(required)
+        order.append(name)
+
+    for name in names or FIELDS:
+        visit(name)
+
+    return order
+
+def datasets(names=None, profile=None):
+    # The datasets that have to be fetched to work out a set of fields.
+    needed = {dataset for name in resolve(names, profile) if name != 'score' for dataset in METRICS[name].datasets}
+    return [name for name in info_data.DATASETS if name in needed]
+
+def columns(names=None):
+    # COLUMNS for a set of fields (the ticker is always included).
+    if not names:
+        return COLUMNS
+    return [column for column in COLUMNS if column[1] == 'ticker' or column[1] in names]
+
+def as_row(metrics):
+    # Flatten a record into a dict of plain values (the estimated set becomes
+    # one '<field>_estimated' flag per field that can be an estimate).
+    row = {f.name: getattr(metrics, f.name) for f in fields(metrics) if f.name != 'estimated'}
+
+    for name in ESTIMATED:
+        row[f'{name}_estimated'] = name in metrics.estimated
+
+    return row
+
+def from_row(row):
+    # The reverse of as_row().
+    row = dict(row)
+    estimated = frozenset(name for name in ESTIMATED if row.pop(f'{name}_estimated', False))
+    values = {name: math.nan if value is None and name not in TEXT else value
+              for name, value in row.items()}
+    return TickerMetrics(**values, estimated=estimated)
+
+# Everything collect() reads, used to tell whether a ticker's metrics need to
+# be worked out again.  Bump INPUTS_VERSION whenever the way the metrics are
+# calculated changes so stored results aren't reused.
+INPUTS_VERSION = 2
+INPUT_DATASETS = ['balance_sheet', 'quarterly_balance_sheet', 'cashflow', 'income_stmt', 'quarterly_income_stmt']
+INPUT_FIELDS = ['financialCurrency', 'sector', 'industry', 'marketCap', 'currentPrice', 'trailingEps', 'trailingPE', 'currentRatio', 'quickRatio']
+
+@timing.stage
+def inputs_digest(data, profile=None, names=None):
+    """
+    Hash everything the metrics and score for a ticker are worked out from: the
+    statements, the info fields (price etc.), the exchange rate and the
+    scoring profile.
+
+    Parameters:
+    - data: FinancialData.data for the ticker.
+    - profile (dict): Scoring profile, defaults to scoring.DEFAULT_PROFILE.
+    - names (list): Only the inputs of these fields (see --fields), defaults to all.
+
+    Returns:
+    str: Hex digest of the inputs.
+    """
+    if names:
+        # Only look at (and so only fetch) what the fields need.
+        needed = resolve(names, profile)
+        used = datasets(names, profile)
+        parts = [str(INPUTS_VERSION), json.dumps(profile, sort_keys=True), json.dumps(names)]
+        if 'exchange_rate' in needed:
+            parts.append(repr(num.get_rate(data['info'].get('financialCurrency', None))))
+        if 'info' in used:
+            parts.append(info_data.digest(data['info'], INPUT_FIELDS))
+        parts.extend(info_data.digest(data[name]) for name in INPUT_DATASETS if name in used)
+
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    info = data['info']
+    parts = [str(INPUTS_VERSION), json.dumps(profile, sort_keys=True),
+             repr(num.get_rate(info.get('financialCurrency', None))),
+             info_data.digest(info, INPUT_FIELDS)]
+    parts.extend(info_data.digest(data[name]) for name in INPUT_DATASETS)
+
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+def collect_cached(ticker, data, cache, profile=None, names=None):
+    # collect() but reuse the metrics stored in the cache when none of the
+    # inputs have changed since they were worked out.
+    inputs = inputs_digest(data, profile, names)
+    row = cache.get_result(ticker, inputs)
+
+    if row is not None:
+        return from_row(row)
+
+    metrics = collect(ticker, data, profile, names)
+    cache.put_result(ticker, inputs, as_row(metrics))
+
+    return metrics
+
+@timing.stage
+def collect(ticker, data, profile=None, names=None):
+    """
+    Calculate the raw financial metrics and score for a given stock ticker.
+
+    Parameters:
+    - ticker (str): Stock ticker symbol.
+    - data: FinancialData.data for the ticker.
+    - profile (dict): Scoring profile, defaults to scoring.DEFAULT_PROFILE.
+    - names (list): Only work out these fields (and what they require), the
+      rest are left NaN.  Defaults to all of them.
+
+    Returns:
+    TickerMetrics: The raw metrics for the ticker.
+    """
+    needed = resolve(names, profile)
+    values = {}
+
+    # Every statement metric reads the same latest periods and line items,
+    # so they're worked out once for the ticker and shared.
+    data = snapshot.of(data)
+
+    for name in needed:
+        if name != 'score':
+            values[name] = METRICS[name].calculate(data, values)
+
+    # The ratios are only estimates when Yahoo doesn't give them to us directly
+    estimated = frozenset(name for name, key in ESTIMATE_KEYS.items()
+                          if name in values and data['info'].get(key, None) is None)
+
+    values.pop('exchange_rate', None)
+    metrics = TickerMetrics(ticker=ticker.upper(), **values, estimated=estimated)
+
+    if 'score' in needed:
+        metrics.score = num.to_float(fin.calc_score(metrics, profile))
+
+    return metrics
+
+def format_value(value, kind, estimated=False):
+    # Turn a raw value into the text shown in the output.
+    if kind == 'text':
+        return value
+
+    if value is None or math.isnan(value):
+        return 'NaN'
+
+    if kind == 'currency':
+        text = num.format_currency(value)
+    elif kind == 'percent':
+        text = f"{value:.2f}%"
+    elif kind == 'integer':
+        text = f"{value:.0f}"
+    else:
+        text = f"{value:.2f}"
+
+    return f"{text}*" if estimated else text
+
+@timing.stage
+def render(metrics, use_color, columns=COLUMNS):
+    """
+    Format (and optionally color) a metrics record for output.
+
+    Parameters:
+    - metrics (TickerMetrics): Raw metrics for a ticker.
+    - use_color (bool): Flag to enable or disable color formatting.
+    - columns (list): The COLUMNS to render, see columns().
+
+    Returns:
+    dict: Column header to formatted value, in output order.
+    """
+    table = {}
+
+    for header, name, kind, rule in columns:
+        value = getattr(metrics, name)
+        text = format_value(value, kind, name in metrics.estimated)
+
+        if rule is not None:
+            text = fmt.paint(text, value, *rule, use_color)
+
+        table[header] = text
+
+    return table
+
+def values(metrics, columns=COLUMNS):
+    """
+    The raw values of a metrics record for the JSON outputs, unformatted.
+
+    Parameters:
+    - metrics (TickerMetrics): Raw metrics for a ticker.
+    - columns (list): The COLUMNS to include, see columns().
+
+    Returns:
+    dict: Column header to value (None where it couldn't be worked out), in
+    output order.
+    """
+    table = {}
+
+    for header, name, kind, rule in columns:
+        value = getattr(metrics, name)
+        if kind != 'text' and value is not None:
+            value = None if math.isnan(value) else float(value)
+        table[header] = value
+
+    return table
+
+class MetricsTable:
+    # Metrics for a whole universe of tickers stored as columns: a float64
+    # array per numeric field and a bool array per field that can be an
+    # estimate, all indexed by the ticker's position.  That's 8 bytes per value
+    # instead of a float object (and a record) per value, which adds up once a
+    # batch job or server holds tens of thousands of tickers.
+    #
+    # Iterating (or indexing) gives TickerMetrics records back, so a table can
+    # be handed to any of the output writers as it is.
+    def __init__(self, tickers, currencies, columns, estimated=None, labels=None):
+        self.tickers = list(tickers)
+        self.currencies = list(currencies)
+        size = len(self.tickers)
+        # The sector and industry of each ticker.
+        labels = labels or {}
+        self.labels = {name: list(labels[name]) if name in labels else [None] * size for name in TEXT[2:]}
+        self.columns = {name: np.asarray(columns[name], dtype=float) if name in columns else np.full(size, np.nan)
+                        for name in NUMERIC}
+        estimated = estimated or {}
+        self.estimated = {name: np.asarray(estimated[name], dtype=bool) if name in estimated else np.zeros(size, dtype=bool)
+                          for name in ESTIMATED}
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_records(cls, records):
+        records = list(records)
+        return cls(
+            [record.ticker for record in records],
+            [record.currency for record in records],
+            {name: [getattr(record, name) for record in records] for name in NUMERIC},
+            {name: [name in record.estimated for record in records] for name in ESTIMATED},
+            {name: [getattr(record, name) for record in records] for name in TEXT[2:]},
+        )
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __iter__(self):
+        return (self.record(i) for i in range(len(self.tickers)))
+
+    def __getitem__(self, key):
+        # A record by position or by ticker.
+        return self.record(self.index[key] if isinstance(key, str) else key)
+
+    def record(self, i):
+        values = {name: float(column[i]) for name, column in self.columns.items()}
+        estimated = frozenset(name for name, column in self.estimated.items() if column[i])
+        labels = {name: column[i] for name, column in self.labels.items()}
+        return TickerMetrics(self.tickers[i], self.currencies[i], **values, **labels, estimated=estimated)
+
+    def rows(self):
+        # as_row() for every ticker, built from the columns directly.
+        columns = {name: column.tolist() for name, column in self.columns.items()}
+        columns.update(self.labels)
+        columns.update({f'{name}_estimated': column.tolist() for name, column in self.estimated.items()})
+
+        for i, ticker in enumerate(self.tickers):
+            row = {'ticker': ticker, 'currency': self.currencies[i]}
+            row.update((name, column[i]) for name, column in columns.items())
+            yield row
@@ -1,4 +1,16 @@
-from currency_converter import CurrencyConverter
+import json
+import math
+import os
+import threading
+import stonks.timing as timing
+
+# Building a CurrencyConverter parses the whole bundled ECB rate history so
+# there is only ever one of them (and it is only imported and built the first
+# time a rate is needed), and every rate to USD we work out is kept in _rates
+# so looking it up again is just a dict lookup.
+_converter = None
+_rates = {}
+_lock = threading.Lock()
 
 def exchange_currency(value, rate):
     try:
@@ -13,6 +25,45 @@ def exchange_currency(value, rate):
     except (ValueError, TypeError):
         return 'NaN'
     
+def get_converter():
+    global _converter
+
+    if _converter is None:
+        with _lock:
+            if _converter is None:
+                from currency_converter import CurrencyConverter
+                _converter = CurrencyConverter()
+
+    return _converter
+
+def load_rates_file(path):
+    # Pin exchange rates to the ones in a JSON snapshot of currency code to
+    # USD rate (e.g. {"EUR": 1.08}) so runs can be reproduced.  A missing file
+    # is fine, it will be written by save_rates_file() at the end of the run.
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'r') as file:
+        set_rates(json.load(file))
+
+def save_rates_file(path):
+    rates = dict(sorted(get_rates().items()))
+
+    with open(path, 'w') as file:
+        json.dump(rates, file, indent=2)
+
+def get_rates():
+    # Every rate to USD pinned or worked out so far, currency code to rate.
+    with _lock:
+        return dict(_rates)
+
+def set_rates(rates):
+    # Use these rates to USD (currency code to rate) from now on, e.g. the
+    # ones --processes workers worked out, or pinned ones handed to them.
+    with _lock:
+        _rates.update({currency.upper(): float(rate) for currency, rate in rates.items()})
+
+@timing.stage
 def get_rate(from_currency):
 
     fallback_rates = {
@@ -32,24 +83,31 @@ def get_rate(from_currency):
     if not isinstance(from_currency, str) or len(from_currency) != 3:
         raise ValueError("The 'from_currency' parameter must be a 3-letter currency code.")
     
+    rate = _rates.get(from_currency)
+
+    if rate is not None:
+        return rate
+
     to_currency = 'USD'
     value = 100
 
     try:
         # Perform currency conversion using the ExchangeRate-API backend
-        c = CurrencyConverter()
+        c = get_converter()
         result = c.convert(value, from_currency, to_currency)
         rate = result / value
-        return rate
     except Exception as e:
         # If the currency is in the fallback_rates dictionary, use the fallback rate
         if from_currency in fallback_rates:
-            return fallback_rates[from_currency]
+            rate = fallback_rates[from_currency]
         else:
             # Handle other exceptions
             print(f"An error occurred: {e}")
             return None
 
+    _rates[from_currency] = rate
+    return rate
+
 def format_currency(value):
     # Convert long currency values into a more human readable format.  This is
     # accomplished by setting an object of suffixes K, M, B, T, and Q.  If you
@@ -95,3 +153,20 @@ def extract_numeric_value(value, default):
 
     except (ValueError, TypeError):
         return default
+
+def to_float(value):
+    # Raw numeric value or NaN when there isn't one.  Unlike
+    # extract_numeric_value() this never tries to parse formatted strings.
+    try:
+        if value is None:
+            return math.nan
+
+        return float(value)
+
+    except (ValueError, TypeError):
+        return math.nan
+
+def value_or(value, default):
+    # Return value unless it is NaN (or None) in which case return default.
+    value = to_float(value)
+    return default if math.isnan(value) else value
@@ -0,0 +1,246 @@
+import csv
+import json
+import sys
+import stonks.info as info
+import stonks.lazy as lazy
+import stonks.metrics as metrics
+import stonks.ranking as ranking
+
+pd = lazy.module('pandas')
+tabulate = lazy.module('tabulate')
+
+# Writers for each of the output formats.  Every result is written (and
+# flushed) as soon as it is handed over so anything reading our output can
+# work on a ticker as soon as it is done instead of waiting for the whole run.
+#
+# A result is either the TickerMetrics for a ticker or an info.InfoResult from
+# --info, which the text formats always write out as text.  A
+# metrics.MetricsTable can be written too, it is written a ticker at a time.
+
+class Writer:
+    def __init__(self, stream=None, use_color=False, columns=None):
+        self.stream = stream or sys.stdout
+        self.use_color = use_color
+        # The metrics.COLUMNS to write, all of them unless --fields says otherwise.
+        self.columns = columns or metrics.COLUMNS
+
+    def write(self, result):
+        if result is None:
+            return
+
+        if isinstance(result, info.InfoResult):
+            self.print(result.text())
+        elif isinstance(result, metrics.MetricsTable):
+            for record in result:
+                self.write_metrics(record)
+        else:
+            self.write_metrics(result)
+
+    def write_metrics(self, result):
+        raise NotImplementedError
+
+    def print(self, text):
+        self.stream.write(text + '\n')
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+class TableWriter(Writer):
+    def write_metrics(self, result):
+        table = metrics.render(result, self.use_color, self.columns)
+        table_as_list = [[key, value] for key, value in table.items()]
+        self.print(tabulate.tabulate(table_as_list, headers=["Attribute", "Value"], tablefmt="simple"))
+
+class CsvWriter(Writer):
+    # We don't want color formatting data mucking up csv output
+    def __init__(self, stream=None, header=False, columns=None):
+        super().__init__(stream, columns=columns)
+        self.csv_writer = csv.writer(self.stream)
+
+        # The header is only written once, before any of the rows.
+        if header:
+            self.csv_writer.writerow([column[0] for column in self.columns])
+            self.stream.flush()
+
+    def write_metrics(self, result):
+        table = metrics.render(result, False, self.columns)
+        self.csv_writer.writerow([str(value) for value in table.values()])
+        self.stream.flush()
+
+class JsonWriter(Writer):
+    # One pretty printed object per ticker.  The JSON formats are for other
+    # programs to read, so they get the raw numbers rather than the text
+    # render() formats them into.
+    def write_metrics(self, result):
+        self.print(json.dumps(metrics.values(result, self.columns), indent=2))
+
+class JsonlWriter(Writer):
+    # One compact object per line (JSON Lines) so the output can be streamed.
+    def write_metrics(self, result):
+        self.print(json.dumps(metrics.values(result, self.columns), separators=(',', ':')))
+
+class ColumnarWriter(Writer):
+    # Writes typed columns to a Parquet or Arrow IPC (Feather v2) file.  Metrics
+    # get one column per TickerMetrics field, --info statements are written in a
+    # long (ticker, sheet, item, period, value) layout.  Results are buffered and
+    # written out a row group at a time so memory stays flat on big runs.
+    def __init__(self, path, format, batch_size=1000, columns=None):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("--parquet and --arrow need pyarrow, install it with: pip install pyarrow")
+
+        super().__init__(columns=columns)
+        self.pa = pyarrow
+        self.path = path
+        self.format = format
+        self.batch_size = batch_size
+        self.rows = []
+        self.frames = []
+        self.sink = None
+
+    def write(self, result):
+        if result is None:
+            return
+
+        if isinstance(result, info.InfoResult):
+            self.frames.append(result.long())
+        elif isinstance(result, metrics.MetricsTable):
+            # Already in columns, so it goes straight out as its own batch.
+            self.write_batch()
+            self.write_table(self.pa.Table.from_pydict(self.project(self.table_columns(result)), schema=self.metrics_schema()))
+            return
+        elif isinstance(result, ranking.Ranked):
+            self.rows.append(self.project({**metrics.as_row(result.metrics), **result.ranks}))
+        else:
+            self.rows.append(self.project(metrics.as_row(result)))
+
+        if len(self.rows) + len(self.frames) >= self.batch_size:
+            self.write_batch()
+
+    def project(self, row):
+        # Leave out the output columns that weren't asked for (and their
+        # estimated flags), everything else in the row is kept.
+        if self.columns is metrics.COLUMNS:
+            return row
+
+        dropped = {column[1] for column in metrics.COLUMNS} - {column[1] for column in self.columns}
+        return {key: value for key, value in row.items() if key.removesuffix('_estimated') not in dropped}
+
+    def metrics_schema(self):
+        pa = self.pa
+        schema = []
+        names = list(self.project(metrics.as_row(metrics.TickerMetrics(''))))
+        # Columns that aren't TickerMetrics fields, like the ranks.
+        names += [column[1] for column in self.columns if column[1] not in names]
+
+        for name in names:
+            if name in metrics.TEXT:
+                schema.append((name, pa.string()))
+            elif name.endswith('_estimated'):
+                schema.append((name, pa.bool_()))
+            else:
+                schema.append((name, pa.float64()))
+
+        return pa.schema(schema)
+
+    def long_schema(self):
+        pa = self.pa
+        return pa.schema([('ticker', pa.string()), ('sheet', pa.string()), ('item', pa.string()),
+                          ('period', pa.timestamp('ns')), ('value', pa.float64())])
+
+    def table_columns(self, table):
+        columns = {'ticker': table.tickers, 'currency': table.currencies}
+        columns.update(table.columns)
+        columns.update(table.labels)
+        columns.update((f'{name}_estimated', column) for name, column in table.estimated.items())
+        return columns
+
+    def write_batch(self):
+        if self.frames:
+            schema = self.long_schema()
+            table = self.pa.Table.from_pandas(pd.concat(self.frames, ignore_index=True), schema=schema, preserve_index=False)
+        elif self.rows:
+            schema = self.metrics_schema()
+            table = self.pa.Table.from_pylist(self.rows, schema=schema)
+        else:
+            return
+
+        self.rows = []
+        self.frames = []
+        self.write_table(table)
+
+    def write_table(self, table):
+        if self.sink is None:
+            self.open(table.schema)
+
+        self.sink.write_table(table)
+
+    def open(self, schema):
+        if self.format == 'parquet':
+            self.sink = self.pa.parquet.ParquetWriter(self.path, schema)
+        else:
+            self.sink = self.pa.ipc.new_file(self.path, schema)
+
+    def close(self):
+        self.write_batch()
+
+        # Still write a valid (empty) file if nothing made it through.
+        if self.sink is None:
+            self.open(self.metrics_schema())
+
+        self.sink.close()
+
+class MultiWriter(Writer):
+    # Hand every result to several writers (e.g. CSV on stdout and a Parquet file).
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write(self, result):
+        for writer in self.writers:
+            writer.write(result)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+def make_writer(output, use_color=False, header=False, stream=None, parquet=None, arrow=None, names=None, extra=None):
+    """
+    Create the writer for an output format.
+
+    Parameters:
+    - output (str): 'csv', 'json', 'jsonl' or None for a table.
+    - use_color (bool): Flag to enable or disable color formatting (tables only).
+    - header (bool): Include the header row in CSV output.
+    - stream: File object to write to, defaults to stdout.
+    - parquet (str): Also write typed columns to this Parquet file.
+    - arrow (str): Also write typed columns to this Arrow IPC file.
+    - names (list): Only write these fields (see --fields), defaults to all.
+    - extra (list): Columns to write after them, e.g. ranking.columns().
+
+    Returns:
+    Writer: The writer for the format(s).
+    """
+    writers = []
+    columns = metrics.columns(names) + list(extra) if extra else metrics.columns(names)
+
+    if parquet:
+        writers.append(ColumnarWriter(parquet, 'parquet', columns=columns))
+    if arrow:
+        writers.append(ColumnarWriter(arrow, 'arrow', columns=columns))
+
+    # Only write text to stdout alongside a file if a format was asked for.
+    if output is not None or not writers:
+        if output == 'csv':
+            writers.insert(0, CsvWriter(stream, header, columns))
+        elif output == 'json':
+            writers.insert(0, JsonWriter(stream, columns=columns))
+        elif output == 'jsonl':
+            writers.insert(0, JsonlWriter(stream, columns=columns))
+        else:
+            writers.insert(0, TableWriter(stream, use_color, columns))
+
+    return writers[0] if len(writers) == 1 else MultiWriter(writers)
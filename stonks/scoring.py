@@ -0,0 +1,205 @@
+import bisect
+import json
+import math
+import os
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+import stonks.lazy as lazy
+
+np = lazy.module('numpy')
+
+# A scoring profile is a list of rules, one per metric (a TickerMetrics field
+# name).  Each rule has ascending thresholds and the points awarded for getting
+# past each of them:
+#
+# direction         =   'high' or 'low'
+#                       'high' awards points[i] when the value is greater than thresholds[i]
+#                       'low' awards points[i] when the value is less than thresholds[i]
+#
+# and the best one that applies wins.  A metric that couldn't be worked out
+# (NaN) earns the profile's 'missing' points, none by default.
+#
+# This is probably an excessively rudimentary way to calculate the "score" of
+# the given business.  This is completely opinionated and even somewhat
+# arbitrary.  I'm not sure what the actual threshold for a "good" score is but
+# the "perfect" score is 42.  Life, the universe, and everything.
+DEFAULT_PROFILE = {
+    'name': 'default',
+    'missing': 0,
+    'rules': [
+        # The best debt is no debt but the lower the better.
+        {'metric': 'debt_to_equity', 'direction': 'low', 'thresholds': [0.25, 0.5, 1], 'points': [3, 2, 1]},
+        {'metric': 'debt_to_earnings', 'direction': 'low', 'thresholds': [0.25, 0.5, 1], 'points': [5, 2, 1]},
+        # Higher earnings are rewarded.  This may need to be adjusted as
+        # it is extremely unlikely a company will ever have greater earnings
+        # than cost.  And if that were to happen it would likely mean some new
+        # information about the company indicates future prospects are very much
+        # different than past.
+        {'metric': 'earnings_yield', 'direction': 'high', 'thresholds': [0, 0.5, 1], 'points': [1, 2, 3]},
+        # Current ratio is the ratio of all assets to all liabilities.  Since
+        # almost all companies engage in very creative accounting tactics I
+        # don't trust this metric alone which is why I added debt to equity and
+        # debt to earnings metrics.
+        #
+        # Still we like to see more assets than liabilities.
+        {'metric': 'current_ratio', 'direction': 'high', 'thresholds': [0.5, 1, 2], 'points': [1, 2, 3]},
+        # Quick ratio (or Acid test ratio) is a bit better than the current ratio
+        # as it only accounts for liquid assets vs liabilities.
+        {'metric': 'quick_ratio', 'direction': 'high', 'thresholds': [0.5, 1, 2], 'points': [1, 2, 3]},
+        # The faster a company grows revenue the better.
+        {'metric': 'revenue_growth', 'direction': 'high', 'thresholds': [5, 10, 15, 30], 'points': [1, 2, 3, 5]},
+        # Higher profit margins are better
+        {'metric': 'profit_margin', 'direction': 'high', 'thresholds': [5, 10, 15, 30], 'points': [1, 2, 3, 5]},
+        # Higher return on equity is better
+        {'metric': 'return_on_equity', 'direction': 'high', 'thresholds': [5, 10, 15, 30], 'points': [1, 2, 3, 5]},
+        # Growing cashflow is better
+        {'metric': 'avg_fcf_growth', 'direction': 'high', 'thresholds': [5, 10, 15, 30], 'points': [1, 2, 3, 5]},
+        # Cashflow yield, again, is my favorite metric for a business. This
+        # number tells you what you get for your dollar.  You can't accurately
+        # predict the future prospects of a company but this number tells you
+        # what kind of return the business presently makes.
+        {'metric': 'fcf_yield', 'direction': 'high', 'thresholds': [1, 3, 5, 10], 'points': [1, 2, 3, 5]},
+    ],
+}
+
+def number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def check_profile(profile):
+    # Make sure a profile makes sense before we try to score with it.
+    import stonks.metrics as metrics   # metrics imports this module
+
+    if not isinstance(profile, dict) or not isinstance(profile.get('rules'), list):
+        raise ValueError("Scoring profile must have a list of 'rules'.")
+
+    if not number(profile.get('missing', 0)):
+        raise ValueError("Scoring profile 'missing' points must be a number.")
+
+    names = [name for name in metrics.NUMERIC if name != 'score']
+
+    for rule in profile['rules']:
+        if not isinstance(rule, dict):
+            raise ValueError("Scoring rules must each have a 'metric', 'direction', 'thresholds' and 'points'.")
+
+        name = rule.get('metric')
+        thresholds = rule.get('thresholds', [])
+        points = rule.get('points', [])
+
+        if name not in names:
+            raise ValueError(f"Scoring rule for unknown metric '{name}', expected one of: {', '.join(names)}")
+        if not isinstance(thresholds, list) or not isinstance(points, list) or not all(map(number, thresholds + points)):
+            raise ValueError(f"Scoring rule for '{name}' thresholds and points must be lists of numbers.")
+        if rule.get('direction') not in ('high', 'low'):
+            raise ValueError(f"Scoring rule for '{name}' must have a direction of 'high' or 'low'.")
+        if len(thresholds) == 0 or len(thresholds) != len(points):
+            raise ValueError(f"Scoring rule for '{name}' must have one point value per threshold.")
+        if list(thresholds) != sorted(thresholds):
+            raise ValueError(f"Scoring rule for '{name}' thresholds must be in ascending order.")
+
+    return profile
+
+def load_profile(path):
+    """
+    Load a scoring profile from a TOML or JSON file.
+
+    Parameters:
+    - path (str): Path to the profile, or 'default' for the built in profile.
+
+    Returns:
+    dict: The scoring profile.
+
+    Raises:
+    OSError: The file can't be read.
+    ValueError: The file isn't valid TOML or JSON, or isn't a valid profile.
+    """
+    if path is None or path == 'default':
+        return DEFAULT_PROFILE
+
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError("TOML scoring profiles need Python 3.11 or newer, use JSON instead.")
+        with open(path, 'rb') as file:
+            try:
+                profile = tomllib.load(file)
+            except ValueError as e:
+                raise ValueError(f"Scoring profile '{path}' isn't valid TOML: {e}")
+    else:
+        with open(path, 'r') as file:
+            try:
+                profile = json.load(file)
+            except ValueError as e:
+                raise ValueError(f"Scoring profile '{path}' isn't valid JSON: {e}")
+
+    if not isinstance(profile, dict):
+        raise ValueError("Scoring profile must have a list of 'rules'.")
+
+    profile.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    profile.setdefault('missing', DEFAULT_PROFILE['missing'])
+
+    return check_profile(profile)
+
+def score_columns(columns, profile=None):
+    """
+    Score many tickers at once.
+
+    Parameters:
+    - columns (dict): Metric name to an array of raw values, one per ticker.
+    - profile (dict): Scoring profile, defaults to DEFAULT_PROFILE.
+
+    Returns:
+    ndarray: The score for each ticker.
+    """
+    profile = profile or DEFAULT_PROFILE
+    total = None
+
+    for rule in profile['rules']:
+        values = np.asarray(columns[rule['metric']], dtype=float)
+        thresholds = np.asarray(rule['thresholds'], dtype=float)
+
+        # Bin every value in one go.  For 'high' the bin is how many thresholds
+        # the value is greater than, for 'low' how many it isn't less than.
+        if rule['direction'] == 'high':
+            points = np.concatenate(([0], rule['points']))
+            bins = np.searchsorted(thresholds, values, side='left')
+        else:
+            points = np.concatenate((rule['points'], [0]))
+            bins = np.searchsorted(thresholds, values, side='right')
+
+        earned = np.where(np.isnan(values), profile['missing'], points[bins])
+        total = earned if total is None else total + earned
+
+    return total
+
+def score_records(records, profile=None):
+    # Score a list of TickerMetrics records.
+    profile = profile or DEFAULT_PROFILE
+    columns = {rule['metric']: [getattr(record, rule['metric']) for record in records] for rule in profile['rules']}
+    return score_columns(columns, profile)
+
+def score_profiles(columns, profiles):
+    # Score the same tickers under several profiles, returns name -> scores.
+    return {profile['name']: score_columns(columns, profile) for profile in profiles}
+
+def score(metrics, profile=None):
+    # Score a single TickerMetrics record.  The same binning as score_columns()
+    # with bisect, building arrays costs far more than it saves for one record.
+    profile = profile or DEFAULT_PROFILE
+    total = 0
+
+    for rule in profile['rules']:
+        value = float(getattr(metrics, rule['metric']))
+
+        if math.isnan(value):
+            total += profile['missing']
+        elif rule['direction'] == 'high':
+            index = bisect.bisect_left(rule['thresholds'], value)
+            total += rule['points'][index - 1] if index > 0 else 0
+        else:
+            index = bisect.bisect_right(rule['thresholds'], value)
+            total += rule['points'][index] if index < len(rule['points']) else 0
+
+    return float(total)
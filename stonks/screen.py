@@ -0,0 +1,173 @@
+import ast
+import heapq
+import itertools
+import math
+import stonks.metrics as metrics
+
+# Screening a universe: --where keeps the tickers matching an expression over
+# the TickerMetrics fields, e.g.
+#
+#   fcf_yield > 5 and score > 25 and market_cap > 1e9
+#
+# and --top K --sort-by FIELD keeps the best K of those.  The expression is
+# split into the clauses it and's together so the cheap ones can be checked
+# first: clauses only about the price are checked against bulk quotes before
+# anything is fetched per ticker, and clauses only needing 'info' are checked
+# before any statements are fetched.
+
+# Fields that can be worked out from a bulk quote alone (see sources.QUOTE_FIELDS).
+QUOTE_METRICS = ['market_cap', 'current_price', 'eps', 'pe', 'earnings_yield']
+
+# What an expression may be made of: field names, numbers, comparisons,
+# arithmetic and and/or/not.  Anything else (calls, attributes, ...) is refused.
+ALLOWED = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.Compare, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Name, ast.Load, ast.Constant,
+)
+
+FIELDS = [column[1] for column in metrics.COLUMNS]
+
+class Where:
+    # A --where expression, kept as the list of clauses it and's together.
+    # Each clause is (text, fields it uses, compiled code).
+    def __init__(self, clauses):
+        self.clauses = clauses
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parse a --where expression.
+
+        Parameters:
+        - text (str): Expression over TickerMetrics field names.
+
+        Returns:
+        Where: The parsed expression.
+        """
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Invalid --where expression '{text}': {e.msg}")
+
+        body = tree.body
+        parts = body.values if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.And) else [body]
+
+        return cls([clause(part) for part in parts])
+
+    def fields(self):
+        return [name for name in FIELDS if any(name in fields for text, fields, code in self.clauses)]
+
+    def split(self, test):
+        # The clauses whose fields pass test() and the rest, as two Wheres.
+        matched = [entry for entry in self.clauses if test(entry[1])]
+        rest = [entry for entry in self.clauses if not test(entry[1])]
+        return Where(matched), Where(rest)
+
+    def __bool__(self):
+        return bool(self.clauses)
+
+    def __call__(self, record):
+        # A clause reading a value that couldn't be worked out (NaN) fails
+        # whatever it says, so tickers missing a value are always left out.
+        # Comparing NaN alone isn't enough: `not pe > 20` and `pe != 20` are
+        # both true for it.
+        for text, fields, code in self.clauses:
+            values = {name: getattr(record, name) for name in fields}
+            if any(missing(value) for value in values.values()):
+                return False
+            if not eval(code, {'__builtins__': {}}, values):
+                return False
+
+        return True
+
+def missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def clause(node):
+    text = ast.unparse(node)
+
+    for child in ast.walk(node):
+        if not isinstance(child, ALLOWED):
+            raise ValueError(f"Can't use '{ast.unparse(child)}' in --where '{text}'")
+        if isinstance(child, ast.Name) and child.id not in FIELDS:
+            raise ValueError(f"Unknown field '{child.id}' in --where, expected one of: {', '.join(FIELDS)}")
+        if isinstance(child, ast.Constant) and not isinstance(child.value, (int, float, str)):
+            raise ValueError(f"Can't use '{ast.unparse(child)}' in --where '{text}'")
+
+    fields = sorted({child.id for child in ast.walk(node) if isinstance(child, ast.Name)})
+    code = compile(ast.Expression(node), '<where>', 'eval')
+
+    return text, fields, code
+
+def quote_only(fields):
+    # Clauses that can be checked against a bulk quote.
+    return set(fields) <= set(QUOTE_METRICS)
+
+def info_only(fields):
+    # Clauses that only need 'info', not any of the statements.
+    return 'score' not in fields and set(metrics.datasets(fields)) <= {'info'}
+
+def prefilter(where, tickers, quotes, profile=None):
+    """
+    Drop the tickers whose quote already fails the price only clauses.
+
+    Parameters:
+    - where (Where): The --where expression.
+    - tickers (list): Stock ticker symbols.
+    - quotes (dict): Price fields by upper case ticker from info.fetch_quotes().
+    - profile (dict): Scoring profile, defaults to scoring.DEFAULT_PROFILE.
+
+    Returns:
+    list: The tickers to go on with.  Tickers without a quote are kept, they
+    are checked once their own data has been fetched.
+    """
+    early = where.split(quote_only)[0]
+
+    # Clauses without any fields (e.g. `1 > 2`) come out the same for every
+    # ticker, so they are checked once here rather than against each quote.
+    constant, early = early.split(lambda fields: not fields)
+    if constant and not constant(None):
+        return []
+    if not early:
+        return list(tickers)
+
+    names = early.fields()
+    kept = []
+
+    for ticker in tickers:
+        quote = quotes.get(ticker.upper())
+        if quote is None or early(metrics.collect(ticker, {'info': quote}, profile, names)):
+            kept.append(ticker)
+
+    return kept
+
+class Top:
+    # The best k records seen so far by one field, in a heap so a whole
+    # universe never has to be held at once.  With k None every record is kept
+    # (just sorted).  Records with NaN for the field go last.
+    def __init__(self, k, field, ascending=False):
+        self.k = k
+        self.field = field
+        self.ascending = ascending
+        self.heap = []
+        self.order = itertools.count()
+
+    def key(self, record):
+        value = getattr(record, self.field)
+        if missing(value):
+            return -math.inf
+        return -value if self.ascending else value
+
+    def add(self, record):
+        # The heap keeps the worst of the best at the top.  On ties the record
+        # added first wins.
+        entry = (self.key(record), -next(self.order), record)
+
+        if self.k is None or len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def results(self):
+        return [entry[2] for entry in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
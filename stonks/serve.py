@@ -0,0 +1,236 @@
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import stonks.info as info
+import stonks.lazy as lazy
+import stonks.metrics as metrics
+import stonks.numbers as num
+import stonks.scoring as scoring
+import stonks.sources as sources
+import stonks.throttle as throttle
+from stonks.cache import Cache, TTL
+
+# `stonks serve` keeps everything warm in one long running process (pandas,
+# yfinance, the currency converter, exchange rates and the data for every
+# ticker it has seen) and answers over HTTP with JSON:
+#
+#   GET /score?tickers=msft,aapl         score for each ticker
+#   GET /metrics/{ticker}                the metrics table (same as --json)
+#   GET /info/{ticker}/{sheet}           --info data, ?quarterly=1 for quarterly
+#
+# Tickers are kept in memory for --ttl seconds (the same as 'info' in the
+# on-disk cache by default) and then fetched again through the disk cache.
+# At most --max-tickers are kept, the ones used least recently make room for
+# new ones.
+
+SHEETS = ['info', 'balance', 'income', 'cashflow', 'financials']
+
+# Tickers kept in memory at most.
+MAX_ENTRIES = 5000
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class Screener:
+    # In memory cache of FinancialData (and the metrics worked out from it) per
+    # ticker, shared by all of the request threads.  Entries are kept in the
+    # order they were last used, so the one used longest ago is the first to
+    # go once there are more than max_entries.
+    def __init__(self, source=None, limiter=None, retries=0, cache=None, profile=None, ttl=TTL['info'], workers=8,
+                 max_entries=MAX_ENTRIES):
+        self.source = source
+        self.limiter = limiter
+        self.retries = retries
+        self.cache = cache
+        self.profile = profile
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # Tickers for /score are fetched on this pool so a long list doesn't
+        # fetch one ticker at a time.  Everything the request threads use is
+        # imported up front (see lazy.load()), which also keeps the first
+        # request from paying for the imports.
+        lazy.load('numpy', 'pandas', 'yfinance')
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def entry(self, ticker):
+        # Same clean up as the command line, Yahoo wants BRK-B not BRK.B
+        ticker = ticker.replace('/', '-').replace('.', '-').upper()
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.get(ticker)
+
+            if entry is None or now - entry['created'] > self.ttl:
+                entry = {
+                    'created': now,
+                    'data': info.FinancialData(ticker, self.limiter, self.retries, self.cache, self.source),
+                    'metrics': None,
+                    'lock': threading.Lock(),
+                }
+                self.entries[ticker] = entry
+
+            # The least recently used go first: when there are too many, or
+            # when they have expired anyway.
+            self.entries.move_to_end(ticker)
+            while len(self.entries) > self.max_entries or now - next(iter(self.entries.values()))['created'] > self.ttl:
+                self.entries.popitem(last=False)
+
+        return ticker, entry
+
+    def metrics(self, ticker):
+        ticker, entry = self.entry(ticker)
+
+        # Only one thread works out the metrics for a ticker, the rest wait
+        # for it instead of fetching the same data again.
+        with entry['lock']:
+            if entry['metrics'] is None:
+                entry['metrics'] = metrics.collect(ticker, entry['data'].data, self.profile)
+
+            return entry['metrics']
+
+    def info(self, ticker, sheet, quarterly=False):
+        ticker, entry = self.entry(ticker)
+        result = info.get_data(entry['data'].data, sheet, quarterly)
+
+        if sheet == 'info':
+            return result
+
+        return json.loads(info.long_data(ticker, result, sheet).to_json(orient='records', date_format='iso'))
+
+def error_status(error):
+    # Unknown tickers are a 404, anything else going wrong upstream a 502.
+    return 404 if isinstance(error, sources.NotFound) else 502
+
+def number(value):
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+class Handler(BaseHTTPRequestHandler):
+    screener = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+
+        try:
+            if parts == ['score']:
+                body = self.score(query)
+            elif len(parts) == 2 and parts[0] == 'metrics':
+                body = metrics.values(self.screener.metrics(parts[1]))
+            elif len(parts) == 3 and parts[0] == 'info':
+                if parts[2] not in SHEETS:
+                    raise RequestError(400, f"Unknown sheet '{parts[2]}', expected one of: {', '.join(SHEETS)}")
+                quarterly = query.get('quarterly', ['0'])[0].lower() in ('1', 'true', 'yes')
+                body = self.screener.info(parts[1], parts[2], quarterly)
+            else:
+                raise RequestError(404, f"No such endpoint '{url.path}'")
+        except RequestError as e:
+            return self.send(e.status, {'error': str(e)})
+        except Exception as e:
+            return self.send(error_status(e), {'error': str(e)})
+
+        self.send(200, body)
+
+    def score(self, query):
+        tickers = [ticker for value in query.get('tickers', []) for ticker in value.split(',') if ticker]
+
+        if not tickers:
+            raise RequestError(400, "No tickers given, use /score?tickers=msft,aapl")
+
+        return list(self.screener.pool.map(self.score_ticker, tickers))
+
+    def score_ticker(self, ticker):
+        try:
+            result = self.screener.metrics(ticker)
+            return {'ticker': result.ticker, 'score': number(result.score)}
+        except Exception as e:
+            return {'ticker': ticker.upper(), 'score': None, 'error': str(e)}
+
+    def send(self, status, body):
+        payload = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Access log on stderr, only with --verbose.
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(screener, host='127.0.0.1', port=8000, verbose=False):
+    handler = type('ScreenerHandler', (Handler,), {'screener': screener})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='stonks serve', description='Serve stonks metrics and scores over HTTP from a warm, long running process.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--ttl', type=float, default=TTL['info'], help=f"Seconds to keep a ticker in memory before fetching it again (default: {TTL['info']})")
+    parser.add_argument('--max-tickers', type=int, default=MAX_ENTRIES, help=f'Most tickers to keep in memory, the least recently used go first (default: {MAX_ENTRIES})')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='Number of tickers to fetch concurrently for /score (default: 8)')
+    parser.add_argument('--rate', type=float, default=5, help='Maximum requests per second to Yahoo, 0 for unlimited (default: 5)')
+    parser.add_argument('--retries', type=int, default=3, help='Retries with exponential backoff for throttled (429) or failed (5xx) requests (default: 3)')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Directory for the on-disk data cache (default: ~/.cache/stonks)')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the on-disk data cache')
+    parser.add_argument('--source', type=str, default='yahoo', help="Where to get data from: 'yahoo' or 'fixtures:DIR' (default: yahoo)")
+    parser.add_argument('--score-profile', type=str, default='default', help='Scoring profile (TOML or JSON file) to score with (default: built in profile)')
+    parser.add_argument('--rates-file', type=str, help='JSON snapshot of exchange rates to USD to pin')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request on stderr')
+
+    args = parser.parse_args(argv)
+
+    try:
+        source = sources.make_source(args.source)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.rates_file:
+        num.load_rates_file(args.rates_file)
+
+    try:
+        profile = scoring.load_profile(args.score_profile)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Load the currency converter now rather than on the first request.
+    num.get_converter()
+
+    replay = isinstance(source, sources.FixtureSource)
+    screener = Screener(
+        source=source,
+        limiter=throttle.RateLimiter(0 if replay else args.rate),
+        retries=args.retries,
+        cache=None if args.no_cache or replay else Cache(args.cache_dir),
+        profile=profile,
+        ttl=args.ttl,
+        workers=args.workers,
+        max_entries=args.max_tickers,
+    )
+
+    server = make_server(screener, args.host, args.port, args.verbose)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,115 @@
+import functools
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import stonks.numbers as num
+import stonks.timing as timing
+
+# Splitting a run up: --shard i/N runs one of N slices of the ticker list (so a
+# big screen can be spread over machines, each with its own IP and so its own
+# throttle budget) and --processes N works through the tickers on N local
+# processes instead of one interpreter.  `stonks merge` puts the outputs of the
+# shards back together.
+
+def parse(text):
+    """
+    Parse a --shard value.
+
+    Parameters:
+    - text (str): 'i/N', shard i (counting from 0) of N.
+
+    Returns:
+    tuple: (i, N)
+    """
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{text}', expected i/N like 0/4")
+
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{text}', i has to be from 0 to N - 1")
+
+    return index, count
+
+def shard_of(ticker, count):
+    # A stable hash (not hash(), which changes between runs) so a ticker is
+    # always in the same shard whatever machine or order it is run in.
+    digest = hashlib.md5(ticker.upper().encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+def select(tickers, index, count):
+    # The tickers in shard index of count, in their original order.
+    return [ticker for ticker in tickers if shard_of(ticker, count) == index]
+
+# The worker (process_ticker with everything but the ticker filled in) and how
+# many threads to run it on, set up once in every process by init_process().
+_worker = None
+_threads = 1
+
+def init_process(settings):
+    # Rate limiters, caches and --where expressions can't be pickled, so each
+    # process builds its own from the settings.
+    global _worker, _threads
+    import stonks.__main__ as cli
+    import stonks.lazy as lazy
+    import stonks.screen as screen
+    import stonks.throttle as throttle
+    from stonks.cache import Cache
+
+    lazy.load('numpy', 'pandas')
+
+    settings = dict(settings)
+    cache = settings.pop('cache')
+    where = settings.pop('where')
+    _threads = settings.pop('threads')
+
+    # Start off with the parent's exchange rates, so --rates-file pins them
+    # here too, and record timings if the parent does.
+    num.set_rates(settings.pop('rates'))
+    timings = settings.pop('timings')
+    if timings is not None:
+        timing.enable(timings)
+
+    _worker = functools.partial(cli.process_ticker,
+                                limiter=throttle.RateLimiter(settings.pop('rate')),
+                                cache=Cache(*cache) if cache is not None else None,
+                                where=screen.Where.parse(where) if where else None,
+                                **settings)
+
+def process_batch(tickers):
+    # The results, along with the exchange rates and timings the process has
+    # got hold of, for the parent to keep (--rates-file, --profile, ...).
+    import stonks.__main__ as cli
+    results = list(cli.run_tickers(tickers, _worker, _threads))
+    recorder = timing.recorder()
+    return results, num.get_rates(), None if recorder is None else recorder.take()
+
+def run_processes(tickers, processes, settings):
+    """
+    Process tickers on a pool of processes, yielding the results in ticker order.
+
+    Parameters:
+    - tickers (list): Stock ticker symbols.
+    - processes (int): Number of processes.
+    - settings (dict): process_ticker() keyword arguments, except that 'rate'
+      (requests per second for each process), 'cache' ((path, refresh, offline)
+      or None), 'where' (the --where text) and 'threads' (tickers each process
+      works on at once) stand in for what can't be pickled, 'rates' are the
+      exchange rates to start with and 'timings' is None, or whether to also
+      run cProfile, to record timings.
+
+    Returns:
+    generator: process_ticker() results, one per ticker.
+    """
+    # Each task is a batch of as many tickers as a process works on at once,
+    # small enough that results still come back (and are written) steadily.
+    size = max(1, settings['threads'])
+    batches = [tickers[start:start + size] for start in range(0, len(tickers), size)]
+
+    # The rates and timings each batch comes back with are merged in here, so
+    # they end up in --rates-file and the --profile report as with one process.
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_process, initargs=(settings,)) as pool:
+        for results, rates, timings in pool.map(process_batch, batches):
+            num.set_rates(rates)
+            if timings is not None:
+                timing.recorder().merge(timings)
+            yield from results
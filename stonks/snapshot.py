@@ -0,0 +1,283 @@
+import functools
+import math
+import stonks.lazy as lazy
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+# The latest period of a ticker's statements, worked out once and shared by
+# every metric.  Rather than each metric in finance.py finding the latest
+# column of a statement, slicing it out and walking its own chain of fallback
+# line items, a Snapshot turns a statement's latest column into a plain dict
+# the first time it is asked for, and resolves the canonical line items (cash,
+# debt, current liabilities and assets, ...) from those once, however many
+# metrics read them.
+#
+# batch.stack() does the same for many tickers at once with Columns: each
+# statement is pulled out for all of the tickers in one go and the same rules
+# below work the canonical items out as arrays, so the batch metrics fall back
+# exactly the way the per-ticker ones do.
+
+def isnan(value):
+    # NaN is the one value that isn't equal to itself, for floats and arrays
+    # alike.  A None in a statement counts as NaN too.
+    return value is None or value != value
+
+def zero(period, value):
+    # NaN counts for nothing when adding up the parts of a total.
+    return period.pick(isnan(value), 0, value)
+
+# The rules for the canonical line items.  Each gets the statement's latest
+# period, a Period for one ticker or a Periods for many, and only uses its
+# get(), present() and pick() so the same rule works for both.
+
+def cash(period):
+    # Cash and short term investments, or just cash when that's missing or 0.
+    cash = period.get('Cash Cash Equivalents And Short Term Investments', 0)
+    return period.pick(cash == 0, period.get('Cash And Cash Equivalents', 0), cash)
+
+def debt(period):
+    # In the event there is no "Total Debt" metric for the given company we
+    # use "Total Liabilities Net Minority Interest" instead.
+    debt = period.get('Total Debt', math.nan)
+    return period.pick(isnan(debt), period.get('Total Liabilities Net Minority Interest', math.nan), debt)
+
+def earnings(period):
+    # In the event there is no "Gross Profit" metric for the given company we
+    # use "Pretax Income" instead.
+    earnings = period.get('Gross Profit', math.nan)
+    return period.pick(isnan(earnings), period.get('Pretax Income', math.nan), earnings)
+
+def current_liabilities(period):
+    # Summed up from their parts when the statement doesn't have them.
+    payables = period.get('Payables', 0)
+    payables = period.pick(payables == 0, period.get('Payables And Accrued Expenses', 0), payables)
+    payables = period.pick(payables == 0, period.get('Accounts Payable', 0), payables)
+
+    parts = [payables] + [period.get(item, 0) for item in
+                          ('Current Deferred Liabilities', 'Current Debt', 'Other Current Liabilities')]
+    derived = sum(zero(period, part) for part in parts)
+
+    return period.pick(period.present('Current Liabilities'), period.get('Current Liabilities'), derived)
+
+def current_assets(period):
+    # Summed up from their parts when the statement doesn't have them.
+    parts = [cash(period)] + [period.get(item, 0) for item in ('Receivables', 'Inventory', 'Prepaid Assets')]
+    derived = sum(zero(period, part) for part in parts)
+
+    return period.pick(period.present('Current Assets'), period.get('Current Assets'), derived)
+
+def quick_assets(period):
+    # Cash, short term investments and receivables, or just cash when those
+    # come to 0.
+    assets = period.get('Cash Cash Equivalents And Short Term Investments', 0) + period.get('Receivables', 0)
+    return period.pick(assets == 0, period.get('Cash And Cash Equivalents', 0), assets)
+
+# The canonical line items, the statement each is worked out from and its rule.
+ITEMS = {
+    'cash': ('quarterly_balance_sheet', cash),
+    'debt': ('quarterly_balance_sheet', debt),
+    'earnings': ('quarterly_income_stmt', earnings),
+    'current_liabilities': ('quarterly_balance_sheet', current_liabilities),
+    'current_assets': ('quarterly_balance_sheet', current_assets),
+    'quick_assets': ('quarterly_balance_sheet', quick_assets),
+}
+
+class Period(dict):
+    # The line items in one ticker's latest period of a statement, item to value.
+    def present(self, item):
+        return item in self
+
+    @staticmethod
+    def pick(condition, value, otherwise):
+        return value if condition else otherwise
+
+class Periods:
+    # The periods of one statement for many tickers at once.  Works like the
+    # Period of the latest one except that get() and present() give an array
+    # with a value per ticker, and has says which tickers have the statement
+    # at all.  history() gives a line item's values over every period.
+    def __init__(self, frames):
+        blocks = []
+        indexes = []
+        dates = []
+        lengths = np.zeros(len(frames), dtype=int)
+        widths = np.zeros(len(frames), dtype=int)
+
+        # The only per ticker work: taking the values out of each statement.
+        for i, frame in enumerate(frames):
+            if frame is None:
+                continue
+            block = frame.to_numpy()
+            if block.size == 0:
+                continue
+            blocks.append(block)
+            indexes.append(frame.index)
+            dates.append(frame.columns)
+            lengths[i], widths[i] = block.shape
+
+        self.has = lengths > 0
+        self.items = {}
+        self.values = np.full((len(frames), 0), np.nan)
+        self.found = np.zeros((len(frames), 0), dtype=bool)
+
+        if not blocks:
+            return
+
+        # Every ticker's line items are numbered in one go, and so are the
+        # dates of the periods, in order, so the latest has the highest.
+        codes, items = pd.factorize(indexes[0].append(indexes[1:]))
+        ranks = pd.factorize(dates[0].append(dates[1:]), sort=True)[0]
+
+        # Each statement's values are copied into one (rows, periods) array,
+        # padded with NaN, and their dates into a (tickers, periods) one.
+        width = widths.max()
+        self.tickers = np.repeat(np.arange(len(frames)), lengths)
+        self.starts = np.cumsum(lengths) - lengths
+        self.block = np.full((len(self.tickers), width), np.nan)
+        self.dates = np.full((len(frames), width), -1)
+
+        row = column = 0
+        for i, block in zip(np.flatnonzero(self.has), blocks):
+            self.block[row:row + len(block), :block.shape[1]] = block
+            self.dates[i, :block.shape[1]] = ranks[column:column + block.shape[1]]
+            row += len(block)
+            column += block.shape[1]
+
+        self.codes = codes
+        self.items = {item: i for i, item in enumerate(items)}
+        self.values = np.full((len(frames), len(items)), np.nan)
+        self.found = np.zeros((len(frames), len(items)), dtype=bool)
+
+        # The latest period is the first one with the latest date.
+        latest = self.dates.argmax(axis=1)
+        self.values[self.tickers, codes] = self.block[np.arange(len(self.tickers)), latest[self.tickers]]
+        self.found[self.tickers, codes] = True
+
+    def get(self, item, default=None):
+        default = np.nan if default is None else default
+        if item not in self.items:
+            return np.full(len(self.has), default, dtype=float)
+
+        i = self.items[item]
+        return np.where(self.found[:, i], self.values[:, i], default)
+
+    def present(self, item):
+        if item not in self.items:
+            return np.zeros(len(self.has), dtype=bool)
+        return self.found[:, self.items[item]]
+
+    pick = staticmethod(lambda condition, value, otherwise: np.where(condition, value, otherwise))
+
+    def history(self, item):
+        """
+        A line item over every period, for all of the tickers.
+
+        Parameters:
+        - item (str): Line item, e.g. 'Total Revenue'.
+
+        Returns:
+        tuple: Arrays with a value per ticker of the item's latest value, its
+        oldest value, the number of periods it has a value for and its mean,
+        NaN for tickers without it.
+        """
+        result = tuple(np.full(len(self.has), np.nan) for _ in range(4))
+        if item not in self.items:
+            return result
+
+        # The first row of the item in each ticker's statement.
+        rows = np.flatnonzero(self.codes == self.items[item])
+        tickers, first = np.unique(self.tickers[rows], return_index=True)
+        values = self.block[rows[first]]
+        dates = self.dates[tickers]
+
+        # Periods without a value don't count, they sort after every date.
+        present = ~np.isnan(values)
+        count = present.sum(axis=1)
+        last = np.iinfo(dates.dtype).max
+        top = np.where(present, dates, -1)
+        bottom = np.where(present, dates, last)
+
+        # The number of distinct dates with a value.
+        ordered = np.sort(bottom, axis=1)
+        periods = (ordered[:, 0] < last) + ((ordered[:, 1:] != ordered[:, :-1]) & (ordered[:, 1:] < last)).sum(axis=1)
+
+        rows = np.arange(len(tickers))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats = (values[rows, top.argmax(axis=1)], values[rows, bottom.argmin(axis=1)],
+                     periods, np.where(present, values, 0).sum(axis=1) / count)
+
+        for column, stat in zip(result, stats):
+            column[tickers] = np.where(count > 0, stat, np.nan)
+
+        return result
+
+class Resolved:
+    # The canonical line items (see ITEMS) as attributes, each worked out by
+    # resolve() the first time it is read.
+    cash = functools.cached_property(lambda self: self.resolve('cash'))
+    debt = functools.cached_property(lambda self: self.resolve('debt'))
+    earnings = functools.cached_property(lambda self: self.resolve('earnings'))
+    current_liabilities = functools.cached_property(lambda self: self.resolve('current_liabilities'))
+    current_assets = functools.cached_property(lambda self: self.resolve('current_assets'))
+    quick_assets = functools.cached_property(lambda self: self.resolve('quick_assets'))
+
+class Snapshot(Resolved):
+    # Wraps FinancialData.data for a ticker, data[...] still reads the
+    # datasets (and only loads them when they are first read).
+    def __init__(self, data):
+        self.data = data
+        self.periods = {}
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def latest(self, sheet):
+        """
+        The line items in the latest period of a statement.
+
+        Parameters:
+        - sheet (str): Statement dataset, e.g. 'quarterly_balance_sheet'.
+
+        Returns:
+        Period: Line item to value, None if the statement is empty.
+        """
+        if sheet not in self.periods:
+            frame = self.data[sheet]
+
+            if frame is None or frame.empty:
+                self.periods[sheet] = None
+            else:
+                column = frame.to_numpy()[:, frame.columns.values.argmax()]
+                self.periods[sheet] = Period(zip(frame.index.tolist(), column.tolist()))
+
+        return self.periods[sheet]
+
+    def resolve(self, name):
+        # A canonical line item, None if there's no statement to work it out from.
+        sheet, rule = ITEMS[name]
+        period = self.latest(sheet)
+        return None if period is None else rule(period)
+
+class Columns(Resolved):
+    # The batch version of a Snapshot: the same line items for many tickers,
+    # an array with a value per ticker each.
+    def __init__(self, datas):
+        self.datas = list(datas)
+        self.periods = {}
+
+    def statement(self, sheet):
+        # The Periods of a statement for every ticker.
+        if sheet not in self.periods:
+            self.periods[sheet] = Periods([data[sheet] for data in self.datas])
+        return self.periods[sheet]
+
+    def resolve(self, name):
+        # NaN for tickers without the statement to work it out from.
+        sheet, rule = ITEMS[name]
+        periods = self.statement(sheet)
+        return np.where(periods.has, rule(periods), np.nan)
+
+def of(data):
+    # The Snapshot of FinancialData.data, data itself if it already is one.
+    return data if isinstance(data, Snapshot) else Snapshot(data)
@@ -0,0 +1,163 @@
+import json
+import os
+import pickle
+import stonks.lazy as lazy
+
+pd = lazy.module('pandas')
+yf = lazy.module('yfinance')
+
+# A data source is anything with a fetch(ticker, name) method that returns one
+# of the info.DATASETS for a ticker.  FinancialData takes care of caching, rate
+# limiting and retrying on top of it, so a source only has to get the data.
+# Sources may also have an async afetch(ticker, name), which the asyncio
+# front end (AsyncFinancialData) awaits directly instead of running fetch() on
+# a worker thread.
+#
+# A source with a quotes(tickers) method can also fetch just the price fields
+# for many tickers in one request (see info.fetch_quotes).
+
+# The fields of 'info' that change with the price, and what the bulk quote
+# endpoint calls them.  Everything else in 'info' is fundamentals.
+QUOTE_FIELDS = {
+    'currentPrice': 'regularMarketPrice',
+    'marketCap': 'marketCap',
+    'trailingEps': 'epsTrailingTwelveMonths',
+    'trailingPE': 'trailingPE',
+}
+
+class YahooSource:
+    # Fetches datasets from Yahoo through yfinance.  Every Ticker created here
+    # uses the same session, so requests to Yahoo reuse a small pool of
+    # keep-alive connections instead of a new TLS handshake per ticker.  With
+    # no session given that is yfinance's own shared session, pass one in to
+    # control the pool (or proxy, headers, etc.) yourself.
+    def __init__(self, session=None):
+        self.session = session
+
+    def fetch(self, ticker, name):
+        return getattr(yf.Ticker(ticker, session=self.session), name)
+
+    def quotes(self, tickers):
+        # One request to the v7 quote endpoint for the price fields of all of
+        # the tickers, keyed by upper case ticker with the 'info' field names.
+        # Tickers Yahoo doesn't know are left out.
+        from yfinance.const import _QUERY1_URL_
+        from yfinance.data import YfData
+
+        params = {'symbols': ','.join(tickers), 'formatted': 'false'}
+        response = YfData(session=self.session).get_raw_json(f"{_QUERY1_URL_}/v7/finance/quote", params=params)
+        results = (response.get('quoteResponse') or {}).get('result') or []
+
+        return {quote['symbol'].upper(): {field: quote[key] for field, key in QUOTE_FIELDS.items() if quote.get(key) is not None}
+                for quote in results if quote.get('symbol')}
+
+class NotFound(ValueError):
+    # The source has nothing for a ticker (or one of its datasets), as opposed
+    # to failing to get it.
+    pass
+
+default_source = YahooSource()
+
+class FixtureSource:
+    # Replays datasets recorded by RecordingSource from a directory, one sub
+    # directory per ticker, so runs can be repeated without the network and
+    # always give the same results.  Statements are Feather (Arrow IPC) files
+    # read with memory mapping (or pickles if they were recorded without
+    # pyarrow) and info is JSON.
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self, ticker, name):
+        directory = os.path.join(self.path, ticker.upper())
+
+        if name == 'info':
+            file = os.path.join(directory, 'info.json')
+            if os.path.exists(file):
+                with open(file, 'r') as stream:
+                    return json.load(stream)
+        else:
+            file = os.path.join(directory, f'{name}.feather')
+            if os.path.exists(file):
+                # Stored transposed since Feather wants string column names.
+                return feather().read_table(file, memory_map=True).to_pandas().T
+
+            file = os.path.join(directory, f'{name}.pkl')
+            if os.path.exists(file):
+                with open(file, 'rb') as stream:
+                    return pickle.load(stream)
+
+        raise NotFound(f"No recorded '{name}' for {ticker.upper()} in {self.path}")
+
+    def tickers(self):
+        return sorted(entry for entry in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, entry)))
+
+def make_source(spec):
+    """
+    Create the data source for --source.
+
+    Parameters:
+    - spec (str): 'yahoo' or 'fixtures:DIR' to replay recorded datasets.
+
+    Returns:
+    The data source.
+    """
+    if spec == 'yahoo':
+        return default_source
+
+    if spec.startswith('fixtures:'):
+        path = spec[len('fixtures:'):]
+        if not os.path.isdir(path):
+            raise ValueError(f"Fixture directory '{path}' does not exist")
+        return FixtureSource(path)
+
+    raise ValueError(f"Unknown data source '{spec}', expected 'yahoo' or 'fixtures:DIR'")
+
+class RecordingSource:
+    # Passes fetches through to another source and writes everything it hands
+    # back to a directory FixtureSource can replay.
+    def __init__(self, source, path):
+        self.source = source
+        self.path = path
+
+    def fetch(self, ticker, name):
+        value = self.source.fetch(ticker, name)
+        record(self.path, ticker, name, value)
+        return value
+
+def feather():
+    try:
+        import pyarrow.feather
+    except ImportError:
+        raise ImportError("Feather fixtures need pyarrow, install it with: pip install pyarrow")
+
+    return pyarrow.feather
+
+def record(path, ticker, name, value):
+    """
+    Write a dataset where FixtureSource can find it.
+
+    Parameters:
+    - path (str): Fixture directory.
+    - ticker (str): Stock ticker symbol.
+    - name (str): Dataset name (one of info.DATASETS).
+    - value: The dataset.
+    """
+    directory = os.path.join(path, ticker.upper())
+    os.makedirs(directory, exist_ok=True)
+
+    if name == 'info':
+        with open(os.path.join(directory, 'info.json'), 'w') as stream:
+            json.dump(value, stream, default=str)
+        return
+
+    # Feather when we can, pickle for anything it can't hold (or no pyarrow).
+    file = os.path.join(directory, f'{name}.feather')
+    try:
+        feather().write_feather(value.T, file)
+        return
+    except (ImportError, ValueError, TypeError, AttributeError):
+        if os.path.exists(file):
+            os.remove(file)
+
+    with open(os.path.join(directory, f'{name}.pkl'), 'wb') as stream:
+        pickle.dump(value, stream, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,119 @@
+import random
+import sys
+import threading
+import time
+import stonks.lazy as lazy
+import stonks.timing as timing
+
+# Only the asyncio front end (stonks.asyncdata) needs it.
+asyncio = lazy.module('asyncio')
+
+# Yahoo answers with a 429 when it decides we are asking for too much and the
+# occasional 5xx when it is having a bad day.  Both are worth another try,
+# anything else (404 for an unknown ticker for instance) is not.
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class RateLimiter:
+    # Token bucket rate limiter shared by all of the worker threads.  Every
+    # request to Yahoo takes a token, tokens refill at `rate` per second and
+    # at most `burst` of them can be saved up.  A rate of 0 disables limiting.
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        # Take a token if there is one, otherwise return how long to wait for it.
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+
+        while (wait := self.take()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        # Same as acquire() but waits without blocking the event loop.
+        if self.rate <= 0:
+            return
+
+        while (wait := self.take()) > 0:
+            await asyncio.sleep(wait)
+
+def status_code(error):
+    # Pull the HTTP status code out of a requests style exception if it has one.
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def is_retryable(error):
+    # Only yfinance raises its rate limit error, so if it hasn't been imported
+    # (replaying fixtures, --offline) there's nothing to check and importing
+    # it here would undo the lazy imports.
+    if sys.modules.get('yfinance') is not None:
+        from yfinance.exceptions import YFRateLimitError
+
+        if isinstance(error, YFRateLimitError):
+            return True
+
+    return status_code(error) in RETRY_STATUS
+
+def delay(attempt, backoff):
+    # Exponential backoff plus a little jitter so the workers don't all come
+    # back at the same moment.
+    return backoff * (2 ** attempt) + random.uniform(0, backoff)
+
+def retry(func, retries=3, backoff=1.0, limiter=None, on_retry=None):
+    # Call func() and retry it with exponential backoff when Yahoo throttles us
+    # or has a server error.  Every attempt has to get past the limiter and
+    # on_retry(error) is called before each retry.
+    attempt = 0
+
+    while True:
+        if limiter is not None:
+            with timing.timed('throttle.wait'):
+                limiter.acquire()
+
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+
+            if on_retry is not None:
+                on_retry(e)
+
+            with timing.timed('throttle.backoff'):
+                time.sleep(delay(attempt, backoff))
+            attempt += 1
+
+async def retry_async(func, retries=3, backoff=1.0, limiter=None, on_retry=None):
+    # retry() for coroutines, func() is called for a new awaitable every attempt.
+    attempt = 0
+
+    while True:
+        if limiter is not None:
+            await limiter.acquire_async()
+
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+
+            if on_retry is not None:
+                on_retry(e)
+
+            await asyncio.sleep(delay(attempt, backoff))
+            attempt += 1
@@ -0,0 +1,265 @@
+import cProfile
+import functools
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+import stonks.lazy as lazy
+
+tabulate = lazy.module('tabulate')
+
+# Per ticker, per stage timings for --profile and --metrics-out.  Nothing is
+# recorded (and timed() costs next to nothing) until enable() is called.
+#
+# Stages nest: a dataset is fetched the first time a metric asks for it, so
+# the fetch happens inside the metric.  Every stage is recorded with its self
+# time, what is left once the stages inside it are taken out, so the fetch
+# isn't counted against the metric as well.
+
+_recorder = None
+
+# Upper bounds (seconds) of the histogram buckets in the report.
+BUCKETS = [0.001, 0.01, 0.1, 1, 10]
+BUCKET_NAMES = ['<1ms', '<10ms', '<100ms', '<1s', '<10s', '>=10s']
+
+class Recorder:
+    def __init__(self, profile=False):
+        self.profile = profile
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # ticker -> stage -> [calls, seconds]
+        self.tickers = {}
+        self.totals = {}
+        self.profilers = []
+        # cProfile stats merge()d from other processes.
+        self.merged = []
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+            self.local.ticker = None
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, name):
+        stack = self.stack()
+        frame = [name, 0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+
+            if stack:
+                stack[-1][1] += elapsed
+
+            self.add(self.local.ticker, name, elapsed - frame[1])
+
+    def add(self, ticker, name, seconds):
+        with self.lock:
+            stages = self.tickers.setdefault(ticker or '-', {})
+            entry = stages.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    @contextmanager
+    def ticker(self, ticker):
+        self.stack()
+        self.local.ticker = ticker
+        profiler = self.profiler()
+        start = time.perf_counter()
+
+        if profiler is not None:
+            profiler.enable()
+
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+            with self.lock:
+                self.totals[ticker] = self.totals.get(ticker, 0.0) + time.perf_counter() - start
+
+            self.local.ticker = None
+
+    def profiler(self):
+        # cProfile only sees the thread it was enabled on, so every worker
+        # thread gets its own profiler and they are merged for the dump.
+        if not self.profile:
+            return None
+
+        if not hasattr(self.local, 'profiler'):
+            self.local.profiler = cProfile.Profile()
+            with self.lock:
+                self.profilers.append(self.local.profiler)
+
+        return self.local.profiler
+
+    def stages(self):
+        # stage -> list of per ticker seconds
+        result = {}
+
+        with self.lock:
+            for stages in self.tickers.values():
+                for name, (calls, seconds) in stages.items():
+                    result.setdefault(name, []).append(seconds)
+
+        return result
+
+    def report(self, top=10):
+        """
+        Summarize the timings as text.
+
+        Parameters:
+        - top (int): Number of slowest tickers to list.
+
+        Returns:
+        str: Per stage totals and histograms followed by the slowest tickers.
+        """
+        rows = []
+
+        for name, times in sorted(self.stages().items(), key=lambda item: -sum(item[1])):
+            times.sort()
+            counts = [0] * len(BUCKET_NAMES)
+            for seconds in times:
+                counts[next((i for i, bound in enumerate(BUCKETS) if seconds < bound), len(BUCKETS))] += 1
+
+            rows.append([name, len(times), f"{sum(times):.3f}", f"{times[len(times) // 2] * 1000:.2f}",
+                         f"{percentile(times, 0.95) * 1000:.2f}", f"{times[-1] * 1000:.2f}", *counts])
+
+        text = tabulate.tabulate(rows, headers=['Stage', 'Tickers', 'Total (s)', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', *BUCKET_NAMES],
+                                 tablefmt='simple')
+
+        with self.lock:
+            slowest = sorted(self.totals.items(), key=lambda item: -item[1])[:top]
+            rows = [[ticker, f"{seconds * 1000:.1f}", *self.slowest_stage(ticker)] for ticker, seconds in slowest]
+
+        text += '\n\n' + tabulate.tabulate(rows, headers=['Ticker', 'Total (ms)', 'Slowest stage', 'Stage (ms)'], tablefmt='simple')
+
+        return text
+
+    def slowest_stage(self, ticker):
+        stages = self.tickers.get(ticker)
+        if not stages:
+            return ['', '']
+
+        name, (calls, seconds) = max(stages.items(), key=lambda item: item[1][1])
+        return [name, f"{seconds * 1000:.1f}"]
+
+    def dump(self, path):
+        # Everything recorded as JSON: per ticker stage timings and totals.
+        with self.lock:
+            tickers = {ticker: {'total': self.totals.get(ticker),
+                                'stages': {name: {'calls': calls, 'seconds': seconds}
+                                           for name, (calls, seconds) in stages.items()}}
+                       for ticker, stages in self.tickers.items()}
+
+        stages = {name: {'tickers': len(times), 'seconds': sum(times)} for name, times in self.stages().items()}
+
+        with open(path, 'w') as file:
+            json.dump({'stages': stages, 'tickers': tickers}, file, indent=2)
+
+    def dump_stats(self, path):
+        with self.lock:
+            profilers = [profiler for profiler in self.profilers if profiler.getstats()]
+            profilers += [Profiled(stats) for stats in self.merged]
+
+        if profilers:
+            pstats.Stats(*profilers).dump_stats(path)
+
+    def take(self):
+        # Everything recorded so far, in a form that can be pickled and sent
+        # to another process to merge(), and forget it here.  Only called
+        # while no ticker is being worked on.
+        with self.lock:
+            profilers = [profiler for profiler in self.profilers if profiler.getstats()]
+            taken = {'tickers': self.tickers, 'totals': self.totals,
+                     'stats': pstats.Stats(*profilers).stats if profilers else None}
+            self.tickers = {}
+            self.totals = {}
+
+        for profiler in profilers:
+            profiler.clear()
+
+        return taken
+
+    def merge(self, taken):
+        # Add in what another process's recorder take()s.
+        with self.lock:
+            for ticker, stages in taken['tickers'].items():
+                mine = self.tickers.setdefault(ticker, {})
+                for name, (calls, seconds) in stages.items():
+                    entry = mine.setdefault(name, [0, 0.0])
+                    entry[0] += calls
+                    entry[1] += seconds
+
+            for ticker, seconds in taken['totals'].items():
+                self.totals[ticker] = self.totals.get(ticker, 0.0) + seconds
+
+            if taken['stats'] is not None:
+                self.merged.append(taken['stats'])
+
+class Profiled:
+    # cProfile stats taken from another process's profilers, in a form
+    # pstats.Stats() can add up with the ones here.
+    def __init__(self, stats):
+        self.stats = dict(stats)
+
+    def create_stats(self):
+        pass
+
+def percentile(values, fraction):
+    # values have to be sorted already.
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def enable(profile=False):
+    """
+    Start recording timings.
+
+    Parameters:
+    - profile (bool): Also run cProfile on every ticker (for dump_stats()).
+
+    Returns:
+    Recorder: The recorder the timings go to.
+    """
+    global _recorder
+    _recorder = Recorder(profile)
+    return _recorder
+
+def recorder():
+    return _recorder
+
+@contextmanager
+def _nothing():
+    yield
+
+def timed(name):
+    # Context manager timing the stage `name` if timings are being recorded.
+    if _recorder is None:
+        return _nothing()
+    return _recorder.stage(name)
+
+def ticker(name):
+    # Context manager marking everything inside it as work for one ticker.
+    if _recorder is None:
+        return _nothing()
+    return _recorder.ticker(name)
+
+def stage(func):
+    # Decorator timing every call to func as the stage '<module>.<name>'.
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _recorder is None:
+            return func(*args, **kwargs)
+
+        with _recorder.stage(name):
+            return func(*args, **kwargs)
+
+    return wrapper
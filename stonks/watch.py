@@ -0,0 +1,280 @@
+import argparse
+import dataclasses
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import stonks.finance as fin
+import stonks.formatting as fmt
+import stonks.info as info
+import stonks.lazy as lazy
+import stonks.metrics as metrics
+import stonks.numbers as num
+import stonks.scoring as scoring
+import stonks.sources as sources
+import stonks.throttle as throttle
+from stonks.cache import Cache, DAY
+
+# `stonks watch` keeps a watchlist scored in one long running process.  The
+# fundamentals for every ticker are fetched (through the cache) once, after
+# that each cycle only polls the price fields with bulk quote requests and
+# works out the metrics that depend on the price again:
+#
+#   12:00:00 MSFT 374.58 score 25 yellow
+#   12:01:00 MSFT 380.10 score 25 -> 29 yellow -> green
+#
+# A line is only printed when a ticker's score, or the band (color) of one of
+# the price dependent metrics, changes.
+
+# Metrics worked out again from every quote.  Everything else only changes with
+# the statements.
+PRICE_METRICS = ['market_cap', 'current_price', 'eps', 'pe', 'earnings_yield', 'fcf_yield', 'score']
+
+# Price dependent metrics with a color band to watch, and their color rules.
+BANDED = {name: rule for header, name, kind, rule in metrics.COLUMNS if name in PRICE_METRICS and rule is not None}
+
+def price(quote, field, current):
+    # A quote field as a float, keeping the current value if the quote hasn't got it.
+    value = quote.get(field)
+    return current if value is None else num.to_float(value)
+
+def reprice(record, quote, profile=None):
+    """
+    Work out the price dependent metrics for a ticker again from a fresh quote.
+
+    Parameters:
+    - record (TickerMetrics): Metrics worked out from the full datasets.
+    - quote (dict): Price fields from info.fetch_quotes().
+    - profile (dict): Scoring profile, defaults to scoring.DEFAULT_PROFILE.
+
+    Returns:
+    TickerMetrics: A copy of record with the new price, yields and score.
+    """
+    current_price = price(quote, 'currentPrice', record.current_price)
+    market_cap = price(quote, 'marketCap', record.market_cap)
+    eps = price(quote, 'trailingEps', record.eps)
+
+    result = dataclasses.replace(
+        record,
+        market_cap=market_cap,
+        current_price=current_price,
+        eps=eps,
+        pe=price(quote, 'trailingPE', record.pe),
+        earnings_yield=num.to_float(fin.earnings_yield({'info': {'trailingEps': eps, 'currentPrice': current_price}})),
+        fcf_yield=num.to_float(fin.fcf_yield(market_cap, record.avg_fcf)),
+    )
+    result.score = num.to_float(fin.calc_score(result, profile))
+
+    return result
+
+def bands(record):
+    # Band of every watched metric, None where the metric is NaN.
+    return {name: None if math.isnan(getattr(record, name)) else fmt.band(getattr(record, name), *rule)
+            for name, rule in BANDED.items()}
+
+def changes(old, new, use_color=False):
+    """
+    Describe what changed between two sets of metrics for a ticker.
+
+    Parameters:
+    - old (TickerMetrics): The last metrics reported, None if there weren't any.
+    - new (TickerMetrics): The latest metrics.
+    - use_color (bool): Flag to enable or disable color formatting.
+
+    Returns:
+    str: A line for the watch output, None when nothing worth reporting changed.
+    """
+    score = lambda record: metrics.format_value(record.score, 'integer')
+    paint = lambda text, name, value: fmt.paint(text, value, *BANDED[name], use_color)
+    new_bands = bands(new)
+
+    parts = [time.strftime('%H:%M:%S'), new.ticker, metrics.format_value(new.current_price, 'currency')]
+
+    if old is None:
+        parts += ['score', paint(score(new), 'score', new.score)]
+        parts += [paint(new_bands['score'] or 'NaN', 'score', new.score)]
+        return ' '.join(parts)
+
+    old_bands = bands(old)
+    if score(old) == score(new) and old_bands == new_bands:
+        return None
+
+    parts += ['score', score(old) if score(old) == score(new) else f"{score(old)} -> {paint(score(new), 'score', new.score)}"]
+
+    for name in BANDED:
+        if old_bands[name] != new_bands[name]:
+            label = [] if name == 'score' else [name]
+            parts += label + [f"{old_bands[name] or 'NaN'} -> {paint(new_bands[name] or 'NaN', name, getattr(new, name))}"]
+
+    return ' '.join(parts)
+
+class Watch:
+    # The metrics for every ticker on the watchlist, worked out in full once
+    # (and again every `fundamentals` seconds) and repriced every cycle.
+    def __init__(self, tickers, source=None, limiter=None, retries=0, cache=None, profile=None, fundamentals=DAY, workers=8):
+        self.tickers = list(dict.fromkeys(ticker.replace('/', '-').replace('.', '-').upper() for ticker in tickers))
+        self.source = source or sources.default_source
+        self.limiter = limiter
+        self.retries = retries
+        self.cache = cache
+        self.profile = profile
+        self.fundamentals = fundamentals
+        self.workers = max(1, workers)
+        # ticker -> (monotonic time loaded, metrics from the full datasets)
+        self.loaded = {}
+        # ticker -> metrics last reported
+        self.reported = {}
+        # The fundamentals are loaded on a pool of threads, see lazy.load().
+        lazy.load('numpy', 'pandas')
+
+    def poll(self):
+        # Price fields for every ticker.  Sources without bulk quotes (e.g.
+        # replayed fixtures) have 'info' fetched for each ticker instead.
+        if hasattr(self.source, 'quotes'):
+            return info.fetch_quotes(self.tickers, self.source, self.limiter, self.retries)
+
+        quotes = {}
+        for ticker in self.tickers:
+            # Like the quote endpoint, tickers that can't be found are left out.
+            try:
+                value = throttle.retry(lambda: self.source.fetch(ticker, 'info'), self.retries, limiter=self.limiter)
+            except Exception:
+                continue
+            quotes[ticker] = {field: value[field] for field in sources.QUOTE_FIELDS if value.get(field) is not None}
+
+        return quotes
+
+    def load(self, ticker, quote):
+        data = info.FinancialData(ticker, self.limiter, self.retries, self.cache, self.source, quote)
+
+        if self.cache is not None:
+            return metrics.collect_cached(ticker, data.data, self.cache, self.profile)
+
+        return metrics.collect(ticker, data.data, self.profile)
+
+    def cycle(self, use_color=False):
+        """
+        Poll the prices once and work out which tickers changed.
+
+        Parameters:
+        - use_color (bool): Flag to enable or disable color formatting.
+
+        Returns:
+        list: A line for every ticker whose score or bands changed.
+        """
+        quotes = self.poll()
+        now = time.monotonic()
+
+        # Tickers seen for the first time, or whose fundamentals are due to be
+        # looked at again, get the full treatment (the statements still come
+        # from the cache while they are fresh).
+        stale = [ticker for ticker in self.tickers
+                 if ticker not in self.loaded or now - self.loaded[ticker][0] > self.fundamentals]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(lambda ticker: self.try_load(ticker, quotes.get(ticker)), stale)
+
+            for ticker, record in zip(stale, results):
+                if record is not None:
+                    self.loaded[ticker] = (now, record)
+
+        lines = []
+
+        for ticker in self.tickers:
+            if ticker not in self.loaded:
+                continue
+
+            loaded_at, record = self.loaded[ticker]
+            if loaded_at != now and ticker in quotes:
+                record = reprice(record, quotes[ticker], self.profile)
+
+            line = changes(self.reported.get(ticker), record, use_color)
+            if line is not None:
+                lines.append(line)
+                self.reported[ticker] = record
+
+        return lines
+
+    def try_load(self, ticker, quote):
+        try:
+            return self.load(ticker, quote)
+        except Exception as e:
+            print(f"{ticker}: {e}", file=sys.stderr)
+            return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='stonks watch', description='Keep a watchlist scored, polling prices and printing a line when a score changes.')
+    parser.add_argument('tickers', nargs='*', type=str, help='Stock ticker symbols')
+    parser.add_argument('-f', '--file', type=str, help='Read ticker symbols from a file')
+    parser.add_argument('--interval', type=float, default=60, help='Seconds between price polls (default: 60)')
+    parser.add_argument('--cycles', type=int, default=0, help='Stop after this many polls, 0 to keep going (default: 0)')
+    parser.add_argument('--fundamentals', type=float, default=DAY, help=f'Seconds to keep using the statements before working the full metrics out again (default: {DAY})')
+    parser.add_argument('--no-color', action='store_true', help='Disable colored output')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='Number of tickers to fetch fundamentals for concurrently (default: 8)')
+    parser.add_argument('--rate', type=float, default=5, help='Maximum requests per second to Yahoo, 0 for unlimited (default: 5)')
+    parser.add_argument('--retries', type=int, default=3, help='Retries with exponential backoff for throttled (429) or failed (5xx) requests (default: 3)')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Directory for the on-disk data cache (default: ~/.cache/stonks)')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the on-disk data cache')
+    parser.add_argument('--source', type=str, default='yahoo', help="Where to get data from: 'yahoo' or 'fixtures:DIR' (default: yahoo)")
+    parser.add_argument('--score-profile', type=str, default='default', help='Scoring profile (TOML or JSON file) to score with (default: built in profile)')
+    parser.add_argument('--rates-file', type=str, help='JSON snapshot of exchange rates to USD to pin')
+
+    args = parser.parse_args(argv)
+
+    tickers = list(args.tickers)
+    if args.file:
+        with open(args.file, 'r') as file:
+            tickers.extend(line for line in file.read().splitlines() if line)
+
+    if not tickers:
+        print("Error: No ticker symbols provided.")
+        sys.exit(1)
+
+    try:
+        source = sources.make_source(args.source)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.rates_file:
+        num.load_rates_file(args.rates_file)
+
+    try:
+        profile = scoring.load_profile(args.score_profile)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    replay = isinstance(source, sources.FixtureSource)
+    watch = Watch(
+        tickers,
+        source=source,
+        limiter=throttle.RateLimiter(0 if replay else args.rate),
+        retries=args.retries,
+        cache=None if args.no_cache or replay else Cache(args.cache_dir),
+        profile=profile,
+        fundamentals=args.fundamentals,
+        workers=args.workers,
+    )
+
+    cycles = 0
+
+    try:
+        while True:
+            start = time.monotonic()
+
+            # A failed poll (Yahoo down, throttled past the retries) is
+            # reported and tried again next cycle rather than ending the watch.
+            try:
+                for line in watch.cycle(not args.no_color):
+                    print(line, flush=True)
+            except Exception as e:
+                print(f"Failed to poll prices: {e}", file=sys.stderr)
+
+            cycles += 1
+            if args.cycles and cycles >= args.cycles:
+                break
+
+            time.sleep(max(0.0, args.interval - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import pytest
+import stonks.bench as bench
+import stonks.info as info
+import stonks.sources as sources
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope='session')
+def fixtures(tmp_path_factory):
+    # A fixture directory with the synthetic tickers SYN0 to SYN3 (see
+    # bench.synthetic_data), for replaying with --source fixtures:DIR.
+    path = tmp_path_factory.mktemp('fixtures')
+    for seed in range(4):
+        data = bench.synthetic_data(seed)
+        for name in info.DATASETS:
+            sources.record(str(path), f'SYN{seed}', name, data[name])
+    return str(path)
+
+def stonks(*args):
+    # Run the command line, returning its stdout.
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-m', 'stonks', *args], capture_output=True, text=True, env=env, check=True)
+    return result.stdout
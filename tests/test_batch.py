@@ -0,0 +1,41 @@
+import math
+import numpy as np
+import pytest
+import stonks.batch as batch
+import stonks.bench as bench
+import stonks.metrics as metrics
+
+def same(a, b):
+    return a == b or (math.isnan(a) and math.isnan(b)) or abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+def check(datas):
+    # batch.run() and metrics.collect() give the same metrics for every ticker.
+    table = batch.table(batch.run(datas))
+    for ticker, data in datas.items():
+        one = metrics.collect(ticker, data)
+        two = table[ticker]
+        for name in metrics.NUMERIC:
+            assert same(getattr(one, name), getattr(two, name)), (ticker, name)
+
+def test_synthetic():
+    check(dict(bench.tickers(50)))
+
+@pytest.mark.parametrize('change', ['nan', 'missing', 'empty'])
+def test_uneven_cashflow(change):
+    datas = dict(bench.tickers(8))
+    data = dict(datas['SYN3'])
+    cashflow = data['cashflow'].copy()
+
+    if change == 'nan':
+        cashflow.loc['Free Cash Flow'] = np.nan
+    elif change == 'missing':
+        cashflow = cashflow.drop('Free Cash Flow')
+    else:
+        cashflow = cashflow.iloc[:0, :0]
+
+    data['cashflow'] = cashflow
+    datas['SYN3'] = data
+    check(datas)
+
+    result = batch.run({'SYN3': data})
+    assert math.isnan(result['Avg Cashflow Growth'].iloc[0])
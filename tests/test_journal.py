@@ -0,0 +1,32 @@
+import json
+from conftest import stonks
+
+def test_duplicate_tickers_with_checkpoint(fixtures, tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+    tickers = ['SYN0', 'SYN1', 'SYN0', 'SYN2']
+
+    plain = stonks('--source', f'fixtures:{fixtures}', '--csv', '--fields', 'score', *tickers)
+    checkpointed = stonks('--source', f'fixtures:{fixtures}', '--csv', '--fields', 'score', '--checkpoint', journal, *tickers)
+
+    assert [line.split(',')[0] for line in checkpointed.splitlines()] == tickers
+    assert checkpointed == plain
+
+    # Every ticker is journaled with its own metrics.
+    with open(journal) as file:
+        entries = [json.loads(line) for line in file]
+    assert [entry['ticker'] for entry in entries] == tickers
+    assert entries[0]['result'] == entries[2]['result']
+    assert entries[3]['result'] != entries[0]['result']
+
+    resumed = stonks('--source', f'fixtures:{fixtures}', '--csv', '--fields', 'score', '--checkpoint', journal, '--resume', *tickers)
+    assert resumed == plain
+
+def test_resume_info(fixtures, tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+    source = f'fixtures:{fixtures}'
+
+    stonks('--source', source, '--csv', '--info', 'balance', '--checkpoint', journal, 'SYN0', 'SYN1')
+    resumed = stonks('--source', source, '--csv', '--info', 'balance', '--checkpoint', journal, '--resume', 'SYN0', 'SYN1', 'SYN2')
+
+    # --info output isn't journaled, so the finished tickers are run again.
+    assert resumed == stonks('--source', source, '--csv', '--info', 'balance', 'SYN0', 'SYN1', 'SYN2')